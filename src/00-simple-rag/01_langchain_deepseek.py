@@ -13,48 +13,68 @@ from dotenv import load_dotenv
 # 加载.env文件中的环境变量，包括API密钥等敏感信息
 load_dotenv()
 
-# 导入网页文档加载器，用于从网页爬取内容
-from langchain_community.document_loaders import WebBaseLoader
+# 导入共享的嵌入模型工厂（保证可以跨目录导入utils工具函数）
+import sys
+from pathlib import Path
 
-# 创建网页加载器实例，指定要爬取的URL
-loader = WebBaseLoader(web_paths=("https://zh.wikipedia.org/wiki/深度求索",))  # 深度求索的维基百科页面
-docs = loader.load()  # 执行加载操作，返回Document对象列表
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.embeddings import preload_embedder
 
-# 2. 文本分块
-# 导入递归字符文本分割器，用于将长文本切分成小块
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+# 在后台线程提前加载并预热中文嵌入模型，与下面的网页抓取同时进行
+# 使用BAAI/bge-small-zh模型，这是一个专门针对中文优化的嵌入模型
+# 同一进程内只加载一次；有GPU时自动使用GPU，模型已在本地缓存时跳过联网检查
+# 无GPU时使用INT8量化的ONNX模型（首次运行自动导出到data/models），加快CPU上的向量化
+# 输出向量已归一化，提升相似度计算准确性
+embeddings_future = preload_embedder("BAAI/bge-small-zh", quantize=True)
+
+# 索引缓存：URL、分块参数和嵌入模型都不变时，再次运行直接加载缓存的向量存储，跳过网页抓取、分块和向量化
+# （需要重新抓取网页时删除data/rag_cache目录即可）
+from utils.text_splitter import SPLITTER_NAME, join_chunks, split_documents
+from utils.vectorstores import index_cache_path, load_cached_vectorstore
+
+index_path = index_cache_path("https://zh.wikipedia.org/wiki/深度求索", 1000, 200, SPLITTER_NAME, "BAAI/bge-small-zh")
+index_cached = os.path.exists(index_path)
+
+if not index_cached:
+    # 导入网页文档加载器，用于从网页爬取内容
+    from langchain_community.document_loaders import WebBaseLoader
+    from utils.web_loader import create_session
+
+    # 创建网页加载器实例，指定要爬取的URL
+    # 传入复用连接的HTTP会话（keep-alive连接池 + gzip压缩传输），多个URL时省去重复的TLS握手
+    loader = WebBaseLoader(
+        web_paths=("https://zh.wikipedia.org/wiki/深度求索",),  # 深度求索的维基百科页面
+        session=create_session(),
+    )
+    docs = loader.load()  # 执行加载操作，返回Document对象列表
 
-# 创建文本分割器实例
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,  # 每个文本块的最大字符数（平衡内容完整性和处理效率）
-    chunk_overlap=200,  # 相邻文本块之间的重叠字符数（确保信息不丢失）
-)
-# 将加载的文本分割成多个小块，便于向量化和检索
-all_splits = text_splitter.split_documents(docs)
+# 2. 文本分块
+if not index_cached:
+    # 将加载的文本分割成多个小块，便于向量化和检索
+    # 优先使用Rust实现的semantic-text-splitter（递归按段落、句子、字符切分），未安装时回退到RecursiveCharacterTextSplitter
+    all_splits = split_documents(
+        docs,
+        chunk_size=1000,  # 每个文本块的最大字符数（平衡内容完整性和处理效率）
+        chunk_overlap=200,  # 相邻文本块之间的重叠字符数（确保信息不丢失）
+    )
 
 # 3. 信息嵌入
-# 导入HuggingFace嵌入模型接口
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# 初始化中文嵌入模型
-# 使用BAAI/bge-small-zh模型，这是一个专门针对中文优化的嵌入模型
-# model_kwargs指定使用CPU进行计算，适合没有GPU的环境
-# encode_kwargs中的normalize_embeddings=True确保嵌入向量被归一化，提高检索精度
-embeddings = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-small-zh",  # 中文嵌入模型，体积小但效果良好
-    model_kwargs={"device": "cpu"},   # 使用CPU设备进行计算（可改为"cuda"使用GPU）
-    encode_kwargs={"normalize_embeddings": True},  # 启用向量归一化，提升相似度计算准确性
-)
+# 获取后台加载并预热完成的中文嵌入模型
+embeddings = embeddings_future.result()
 
 # 4. 向量存储
-# 导入内存向量存储，用于存储和检索文档向量
-from langchain_core.vectorstores import InMemoryVectorStore
-
-# 创建向量存储实例，传入嵌入模型
-vector_store = InMemoryVectorStore(embeddings)
-# 将分割后的文档添加到向量存储中
-# 这一步会将所有文档块转换为向量并存储在内存中，用于后续的相似性搜索
-vector_store.add_documents(all_splits)
+# 导入向量存储构建函数，按语料规模选择检索方式：
+# 小语料使用内存矩阵精确检索（一次矩阵乘法完成打分），大语料（1万块以上）使用Faiss HNSW近似索引
+from utils.vectorstores import build_vectorstore, save_vectorstore
+
+if index_cached:
+    # 直接加载缓存的向量存储
+    vector_store = load_cached_vectorstore(index_path, embeddings)
+else:
+    # 创建向量存储实例，将分割后的文档添加到向量存储中
+    # 这一步会将所有文档块转换为向量并存储在内存中，用于后续的相似性搜索
+    vector_store = build_vectorstore(all_splits, embeddings)
+    save_vectorstore(vector_store, index_path)  # 缓存到磁盘，下次运行直接加载
 
 # 第二步：检索阶段
 
@@ -65,8 +85,8 @@ question = "DeepSeek有哪些核心技术？"
 # 6. 在向量存储中搜索相关文档，并准备上下文内容
 # 使用余弦相似度搜索最相关的文档块
 retrieved_docs = vector_store.similarity_search(question, k=3)  # k=3表示检索前3个最相关的文档块
-# 将检索到的文档内容拼接成一个字符串，作为大模型的上下文
-docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
+# 将检索到的文档内容拼接成一个字符串，作为大模型的上下文（去掉相邻文档块之间重叠的重复文本）
+docs_content = join_chunks(retrieved_docs)
 
 # 7. 构建提示模板
 # 导入聊天提示模板，用于格式化用户问题和检索到的上下文
@@ -84,6 +104,9 @@ prompt = ChatPromptTemplate.from_template(
 回答:"""
 )
 
+# 预先拆分模板：固定的指令前缀和问题后缀只解析一次，每次查询只需拼接检索到的上下文和问题
+PROMPT_PREFIX, PROMPT_SUFFIX = prompt.messages[0].prompt.template.split("{context}")
+
 # 第三步：生成阶段
 
 # 8. 使用大语言模型生成答案
@@ -99,7 +122,7 @@ llm = ChatDeepSeek(
 )
 
 # 使用提示模板格式化问题和上下文，然后调用大模型生成答案
-formatted_prompt = prompt.format(question=question, context=docs_content)
+formatted_prompt = PROMPT_PREFIX + docs_content + PROMPT_SUFFIX.format(question=question)
 answer = llm.invoke(formatted_prompt)
 
 # 格式化输出答案
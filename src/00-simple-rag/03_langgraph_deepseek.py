@@ -4,53 +4,81 @@ LangGraph RAG智能问答系统
 包含文档检索和答案生成两个步骤的图状执行流程
 """
 
+import asyncio
 import os
+import sys
+from pathlib import Path
 from typing import List
 from typing_extensions import TypedDict
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
 
 # 1. 加载文档
-# 使用WebBaseLoader从网页加载文档内容
-from langchain_community.document_loaders import WebBaseLoader
+# 在后台线程提前加载并预热共享的中文嵌入模型，与网页抓取同时进行
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # 保证可以跨目录导入utils工具函数
+from utils.embeddings import preload_embedder
 
-loader = WebBaseLoader(
-    web_paths=("https://zh.wikipedia.org/wiki/深度求索",)  # 指定要爬取的网页URL列表
-)
-docs = loader.load()  # 执行加载，返回Document对象列表
+embeddings_future = preload_embedder("BAAI/bge-small-zh", quantize=True)  # 使用bge-small-zh中文嵌入模型（CPU上使用INT8量化ONNX模型）
 
-# 2. 文本分块
-# 将长文档切分成较小的chunk，便于向量化和检索
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+# 索引缓存：URL、分块参数和嵌入模型都不变时，再次运行直接加载缓存的向量存储，跳过网页抓取、分块和向量化
+from utils.text_splitter import SPLITTER_NAME, join_chunks, split_documents
+from utils.vectorstores import index_cache_path, load_cached_vectorstore
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,      # 每个文本块的最大字符数
-    chunk_overlap=200     # 相邻文本块之间的重叠字符数，确保信息连贯性
-)
-all_splits = text_splitter.split_documents(docs)  # 将文档分割成多个chunk
+index_path = index_cache_path("https://zh.wikipedia.org/wiki/深度求索", 1000, 200, SPLITTER_NAME, "BAAI/bge-small-zh")
+index_cached = os.path.exists(index_path)  # 需要重新抓取网页时删除data/rag_cache目录即可
 
-# 3. 信息嵌入
-# 使用HuggingFace的中文嵌入模型将文本转换为向量表示
-from langchain_huggingface import HuggingFaceEmbeddings
+if not index_cached:
+    # 使用WebBaseLoader从网页加载文档内容
+    from langchain_community.document_loaders import WebBaseLoader
+    from utils.web_loader import create_session
 
-embeddings = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-small-zh",                    # 使用bge-small-zh中文嵌入模型
-    model_kwargs={'device': 'cpu'},                    # 指定使用CPU运行（可改为'cuda'使用GPU）
-    encode_kwargs={'normalize_embeddings': True}       # 对嵌入向量进行归一化处理
-)
+    loader = WebBaseLoader(
+        web_paths=("https://zh.wikipedia.org/wiki/深度求索",),  # 指定要爬取的网页URL列表
+        session=create_session()                              # 复用连接的HTTP会话（keep-alive连接池 + gzip压缩传输）
+    )
+    docs = loader.load()  # 执行加载，返回Document对象列表
+
+# 2. 文本分块
+# 将长文档切分成较小的chunk，便于向量化和检索（优先使用Rust实现的semantic-text-splitter）
+if not index_cached:
+    all_splits = split_documents(
+        docs,
+        chunk_size=1000,      # 每个文本块的最大字符数
+        chunk_overlap=200     # 相邻文本块之间的重叠字符数，确保信息连贯性
+    )
+
+# 3. 信息嵌入
+# 使用共享的中文嵌入模型将文本转换为向量表示（同一进程只加载一次，输出向量已归一化）
+embeddings = embeddings_future.result()  # 获取后台加载并预热完成的嵌入模型
 
 # 4. 向量存储
-# 使用内存向量存储来存储和检索文档向量
-from langchain_core.vectorstores import InMemoryVectorStore
+# 按语料规模选择向量存储：小语料使用内存矩阵精确检索，大语料（1万块以上）使用Faiss HNSW近似索引
+from utils.vectorstores import build_vectorstore, save_vectorstore
 
-vector_store = InMemoryVectorStore(embeddings)  # 初始化向量存储，传入嵌入模型
-vector_store.add_documents(all_splits)          # 将分割后的文档添加到向量存储中
+if index_cached:
+    vector_store = load_cached_vectorstore(index_path, embeddings)  # 直接加载缓存的向量存储
+else:
+    vector_store = build_vectorstore(all_splits, embeddings)  # 将分割后的文档向量化并添加到向量存储中
+    save_vectorstore(vector_store, index_path)                # 缓存到磁盘，下次运行直接加载
 
-# 5. 定义RAG提示词
+# 5. 定义RAG提示词和大语言模型
 # 从LangChain Hub拉取预定义的RAG提示词模板
 from langchain import hub
 
 prompt = hub.pull("rlm/rag-prompt")  # 获取标准的RAG提示词模板
 
+# 初始化DeepSeek大语言模型（模块级只创建一次，每次查询复用同一客户端和HTTP连接池）
+import httpx
+from langchain_deepseek import ChatDeepSeek
+
+llm = ChatDeepSeek(
+    model="deepseek-chat",                      # 使用deepseek-chat模型
+    temperature=0.7,                            # 控制生成文本的随机性(0-1，越高越随机)
+    max_tokens=2048,                           # 最大生成token数量
+    api_key=os.getenv("DEEPSEEK_API_KEY"),     # 从环境变量获取API密钥
+    http_async_client=httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=20)),  # 异步调用时保持长连接，多次查询复用
+)
+
 # 6. 定义应用状态
 # 使用TypedDict定义LangGraph工作流中的状态结构
 class State(TypedDict):
@@ -66,45 +94,24 @@ class State(TypedDict):
     context: List[Document]    # 从向量存储中检索到的相关文档
     answer: str               # 大语言模型生成的最终答案
 
-# 7. 定义检索步骤
-def retrieve(state: State) -> dict:
+# 7. 定义检索与生成步骤
+async def retrieve_and_generate(state: State, config: RunnableConfig) -> dict:
     """
-    检索步骤：根据问题从向量存储中检索相关文档
+    检索与生成步骤：根据问题从向量存储中检索相关文档，并基于检索结果生成答案
+    检索和生成在同一个节点内完成，检索结果无需先写回状态再由下一个节点读取
     
     Args:
         state: 当前状态，包含用户问题
+        config: 运行配置，传给大语言模型以便图执行器流式输出生成的token
         
     Returns:
-        dict: 包含检索到的文档的字典，键为"context"
+        dict: 包含生成答案和检索文档的字典，键为"answer"和"context"
     """
     # 使用相似度搜索检索与问题最相关的文档
     retrieved_docs = vector_store.similarity_search(state["question"])
-    return {"context": retrieved_docs}  # 返回检索结果，更新状态中的context字段
-
-# 8. 定义生成步骤
-def generate(state: State) -> dict:
-    """
-    生成步骤：基于检索到的文档和问题生成答案
-    
-    Args:
-        state: 当前状态，包含问题和检索到的上下文文档
-        
-    Returns:
-        dict: 包含生成答案的字典，键为"answer"
-    """
-    # 导入DeepSeek聊天模型
-    from langchain_deepseek import ChatDeepSeek
     
-    # 初始化DeepSeek大语言模型
-    llm = ChatDeepSeek(
-        model="deepseek-chat",                      # 使用deepseek-chat模型
-        temperature=0.7,                            # 控制生成文本的随机性(0-1，越高越随机)
-        max_tokens=2048,                           # 最大生成token数量
-        api_key=os.getenv("DEEPSEEK_API_KEY"),     # 从环境变量获取API密钥
-    )
-    
-    # 将检索到的文档内容拼接成上下文字符串
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
+    # 将检索到的文档内容拼接成上下文字符串（去掉相邻文档块之间重叠的重复文本）
+    docs_content = join_chunks(retrieved_docs)
     
     # 使用提示词模板格式化问题和上下文
     messages = prompt.invoke({
@@ -112,35 +119,48 @@ def generate(state: State) -> dict:
         "context": docs_content
     })
     
-    # 调用大语言模型生成答案
-    response = llm.invoke(messages)
-    return {"answer": response.content}  # 返回生成的答案，更新状态中的answer字段
+    # 异步调用大语言模型生成答案
+    response = await llm.ainvoke(messages, config)
+    return {"answer": response.content, "context": retrieved_docs}  # 一次性更新状态中的answer和context字段
 
-# 9. 构建和编译应用
-# 使用LangGraph构建包含检索和生成步骤的工作流图
+# 8. 构建和编译应用
+# 使用LangGraph构建包含检索与生成节点的工作流图
 from langgraph.graph import START, StateGraph
 
 # 创建状态图并定义执行流程
 graph = (
-    StateGraph(State)                          # 创建状态图，指定状态类型
-    .add_sequence([retrieve, generate])        # 添加顺序执行的节点序列：先检索，后生成
-    .add_edge(START, "retrieve")              # 添加从开始节点到检索节点的边
-    .compile()                                # 编译图，生成可执行的工作流
+    StateGraph(State)                                  # 创建状态图，指定状态类型
+    .add_node("rag", retrieve_and_generate)            # 添加检索与生成节点
+    .add_edge(START, "rag")                           # 添加从开始节点到检索与生成节点的边
+    .compile()                                        # 编译图，生成可执行的工作流
 )
 
-# 10. 运行查询
-# 执行完整的RAG工作流：问题 -> 检索 -> 生成 -> 答案
-question = "DeepSeek有哪些核心技术？"      # 定义要查询的问题
-response = graph.invoke({"question": question})  # 调用图执行器，传入初始状态
-
-# 格式化输出结果
-print("=" * 80)
-print("🤖 LangGraph RAG 智能问答系统")
-print("=" * 80)
-print(f"📝 问题: {question}")
-print("-" * 80)
-print("💡 答案:")
-print(response["answer"])
-print("-" * 80)
-print(f"📚 检索到的文档数量: {len(response.get('context', []))}")
-print("=" * 80)
\ No newline at end of file
+# 9. 运行查询
+# 执行完整的RAG工作流：问题 -> 检索 -> 生成 -> 答案，生成的答案边生成边输出
+async def main():
+    question = "DeepSeek有哪些核心技术？"      # 定义要查询的问题
+    
+    # 格式化输出结果
+    print("=" * 80)
+    print("🤖 LangGraph RAG 智能问答系统")
+    print("=" * 80)
+    print(f"📝 问题: {question}")
+    print("-" * 80)
+    print("💡 答案:")
+    
+    # 流式执行图：messages模式逐段返回大模型生成的token，values模式返回每一步后的完整状态
+    response = {}
+    async for mode, payload in graph.astream({"question": question}, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            chunk, _ = payload
+            print(chunk.content, end="", flush=True)
+        else:
+            response = payload
+    print()
+    
+    print("-" * 80)
+    print(f"📚 检索到的文档数量: {len(response.get('context', []))}")
+    print("=" * 80)
+
+
+asyncio.run(main())
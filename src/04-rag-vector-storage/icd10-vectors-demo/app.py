@@ -126,17 +126,17 @@ def extract_entities_ui(text: str, confidence_threshold: float) -> Tuple[pd.Data
         entities = ner_service.extract_entities(text)
         
         # 过滤低置信度实体
-        filtered_entities = [e for e in entities if e['confidence'] >= confidence_threshold]
+        filtered_entities = [e for e in entities if e.confidence >= confidence_threshold]
         
         # 准备表格数据
         if filtered_entities:
             table_data = []
             for entity in filtered_entities:
                 table_data.append([
-                    entity['text'],
-                    entity['label'],
-                    f"{entity['confidence']:.3f}",
-                    f"{entity['start']}-{entity['end']}"
+                    entity.text,
+                    entity.label,
+                    f"{entity.confidence:.3f}",
+                    f"{entity.start}-{entity.end}"
                 ])
             
             df = pd.DataFrame(table_data, columns=["实体文本", "实体类型", "置信度", "位置"])
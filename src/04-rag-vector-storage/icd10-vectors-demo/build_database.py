@@ -60,8 +60,14 @@ class ICD10Vectorizer:
             logger.error(f"向量化处理失败: {e}")
             raise
     
-    def cleanup_resources(self) -> bool:
-        """清理向量化模型资源"""
+    def cleanup_resources(self, release_cuda_cache: bool = False) -> bool:
+        """
+        清理向量化模型资源
+        
+        Args:
+            release_cuda_cache: 是否同时调用torch.cuda.empty_cache()归还显存，
+                该操作会触发设备同步，仅在需要立即释放显存时显式开启
+        """
         try:
             logger.info("正在清理向量化模型资源...")
             
@@ -75,14 +81,15 @@ class ICD10Vectorizer:
                 del self.model
                 self.model = None
             
-            # 尝试清理CUDA缓存
-            try:
-                import torch
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-                    logger.info("向量化模型CUDA缓存已清理")
-            except ImportError:
-                pass
+            # 仅在显式请求时清理CUDA缓存
+            if release_cuda_cache:
+                try:
+                    import torch
+                    if torch.cuda.is_available():
+                        torch.cuda.empty_cache()
+                        logger.info("向量化模型CUDA缓存已清理")
+                except ImportError:
+                    pass
             
             logger.info("向量化模型资源清理完成")
             return True
@@ -92,7 +99,7 @@ class ICD10Vectorizer:
             return False
     
     def __del__(self):
-        """析构函数：确保资源被清理"""
+        """析构函数：释放模型引用，不触碰CUDA缓存（需要时显式调用cleanup_resources(release_cuda_cache=True)）"""
         try:
             self.cleanup_resources()
         except:
@@ -180,7 +187,7 @@ class DatabaseBuilder:
                     'disease_code': str(row['疾病编码']),
                     'disease_name': str(row['疾病名称']),
                     'description_text': descriptions[i],
-                    'embedding_vector': vectors[i].tolist(),
+                    'embedding_vector': vectors[i],
                     'chapter_name': str(row.get('章名称', '')),
                     'section_name': str(row.get('节名称', ''))
                 }
@@ -6,7 +6,8 @@ ICD-10 RAG检索Demo项目配置文件
 DATABASE_CONFIG = {
     'milvus_host': "localhost",
     'milvus_port': 19530,
-    'collection_name': "icd10_diseases"
+    'collection_name': "icd10_diseases",
+    'replica_number': 1  # 集合加载副本数，多QueryNode部署时可调大
 }
 
 # 向量化配置
@@ -19,7 +20,8 @@ EMBEDDING_CONFIG = {
 # NER配置
 NER_CONFIG = {
     'model_name': "lixin12345/chinese-medical-ner",
-    'confidence_threshold': 0.7
+    'confidence_threshold': 0.7,
+    'backend': "auto"  # pytorch / onnx / auto（无GPU时使用ONNX INT8量化）
 }
 
 # Gradio界面配置
@@ -67,7 +69,7 @@ COLLECTION_SCHEMA = {
         },
         {
             "name": "embedding_vector",
-            "type": "FLOAT_VECTOR",
+            "type": "FLOAT16_VECTOR",  # FP16存储，传输和内存减半；可改回FLOAT_VECTOR
             "dim": 1024,
             "description": "文本向量"
         },
@@ -82,23 +84,45 @@ COLLECTION_SCHEMA = {
             "type": "VARCHAR",
             "max_length": 200,
             "description": "节名称"
+        },
+        {
+            "name": "ngram_tokens",
+            "type": "ARRAY",
+            "element_type": "VARCHAR",
+            "max_capacity": 1024,
+            "max_length": 16,
+            "description": "疾病名称的2/3-gram切分，用于子串检索"
         }
     ]
 }
 
 # 索引配置
 INDEX_CONFIG = {
-    "index_type": "IVF_FLAT",
+    "index_type": "HNSW",  # 可选: HNSW(高召回低延迟) / IVF_SQ8(内存约为1/4) / IVF_PQ / IVF_FLAT
     "metric_type": "IP",  # 内积相似度
     "params": {
-        "nlist": 1024  # 聚类中心数量
+        "HNSW": {"M": 16, "efConstruction": 200},
+        "IVF_FLAT": {"nlist": 1024},  # 聚类中心数量
+        "IVF_SQ8": {"nlist": 256},  # 约为sqrt(N)
+        "IVF_PQ": {"nlist": 256, "m": 64, "nbits": 8}
     }
 }
 
+# 标量索引配置（Milvus 2.4+ 支持INVERTED倒排索引）
+SCALAR_INDEX_CONFIG = {
+    "disease_name": "INVERTED",
+    "ngram_tokens": "INVERTED"
+}
+
 # 检索配置
 SEARCH_CONFIG = {
     'default_top_k': 10,
     'score_threshold': 0.7,
-    'nprobe': 16,
-    'ner_confidence': 0.7
+    'nprobe': 16,  # IVF类索引的搜索聚类数
+    'ef': 64,  # HNSW索引的搜索候选数（实际取 max(ef, 4*limit)）
+    'search_mode': 'batch',  # batch: 子查询合并为一次请求；parallel: 每个子查询单独请求并发执行
+    'max_search_workers': 8,  # parallel模式的线程数
+    'ner_confidence': 0.7,
+    'embedding_cache_size': 4096,  # 查询向量LRU缓存条数
+    'result_cache_size': 1024  # 检索结果LRU缓存条数
 }
\ No newline at end of file
@@ -4,8 +4,10 @@
 基于中文医学预训练模型进行实体识别和分类
 """
 
+import os
 import re
 import logging
+from dataclasses import dataclass, asdict
 from typing import List, Dict, Any
 import torch
 
@@ -14,14 +16,49 @@ from config import NER_CONFIG
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 实体高亮颜色
+ENTITY_COLOR_MAP = {
+    'DISEASE': '#FF6B6B',
+    'SYMPTOM': '#4ECDC4', 
+    'BODY_PART': '#45B7D1',
+    'EXAMINATION': '#96CEB4',
+    'DRUG': '#FFEAA7',
+    'TREATMENT': '#DDA0DD'
+}
+DEFAULT_ENTITY_COLOR = '#95A5A6'
+
+
+@dataclass(slots=True)
+class Entity:
+    """医学实体（slots存储，合并等热点循环中属性赋值比字典写入更快、更省内存）"""
+    text: str
+    label: str
+    confidence: float
+    start: int
+    end: int
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """转换为字典，供JSON序列化等接口边界使用"""
+        return asdict(self)
+
 
 class MedicalNERService:
     """医学命名实体识别服务类"""
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, backend: str = None):
+        """
+        Args:
+            model_name: NER模型名称
+            backend: 推理后端，'pytorch' / 'onnx' / 'auto'（无GPU时使用ONNX Runtime INT8量化模型）
+        """
         self.model_name = model_name or NER_CONFIG['model_name']
+        self.backend = backend or NER_CONFIG['backend']
         self.confidence_threshold = NER_CONFIG['confidence_threshold']
         self.ner_pipeline = None
+        # 预先生成各实体类型的高亮前缀
+        self._span_prefixes = {
+            label: self._build_span_prefix(label, color) for label, color in ENTITY_COLOR_MAP.items()
+        }
         self._load_model()
     
     def _load_model(self):
@@ -33,14 +70,27 @@ class MedicalNERService:
             from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
             
             tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            model = AutoModelForTokenClassification.from_pretrained(self.model_name)
+            
+            model = None
+            use_cuda = torch.cuda.is_available()
+            if self.backend == 'onnx' or (self.backend == 'auto' and not use_cuda):
+                try:
+                    model = self._load_onnx_model()
+                    use_cuda = False
+                except Exception as e:
+                    if self.backend == 'onnx':
+                        raise
+                    logger.warning(f"ONNX模型加载失败，回退到PyTorch: {e}")
+            
+            if model is None:
+                model = AutoModelForTokenClassification.from_pretrained(self.model_name)
             
             self.ner_pipeline = pipeline(
                 "ner",
                 model=model,
                 tokenizer=tokenizer,
                 aggregation_strategy="simple",
-                device=0 if torch.cuda.is_available() else -1
+                device=0 if use_cuda else -1
             )
             
             logger.info("医学NER模型加载完成")
@@ -50,6 +100,31 @@ class MedicalNERService:
             logger.info("使用备用NER方案...")
             self._load_backup_ner()
     
+    def _load_onnx_model(self):
+        """加载ONNX Runtime INT8动态量化模型，首次使用时导出并缓存到HF缓存目录旁"""
+        from huggingface_hub.constants import HF_HUB_CACHE
+        from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        
+        onnx_dir = os.path.join(os.path.dirname(HF_HUB_CACHE), 'onnx', self.model_name.replace('/', '--'))
+        quantized_file = 'model_quantized.onnx'
+        
+        if not os.path.exists(os.path.join(onnx_dir, quantized_file)):
+            logger.info(f"正在导出并量化ONNX模型: {onnx_dir}")
+            model = ORTModelForTokenClassification.from_pretrained(self.model_name, export=True)
+            model.save_pretrained(onnx_dir)
+            
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=onnx_dir, quantization_config=qconfig)
+        
+        logger.info("使用ONNX Runtime INT8量化模型")
+        return ORTModelForTokenClassification.from_pretrained(
+            onnx_dir,
+            file_name=quantized_file,
+            provider='CPUExecutionProvider'
+        )
+    
     def _load_backup_ner(self):
         """备用NER方案：基于规则的实体识别"""
         logger.info("使用基于规则的备用NER识别器")
@@ -79,7 +154,7 @@ class MedicalNERService:
             ]
         }
     
-    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
+    def extract_entities(self, text: str) -> List[Entity]:
         """从文本中提取医学实体"""
         try:
             if not text or not text.strip():
@@ -106,7 +181,7 @@ class MedicalNERService:
         text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9\s，。；：！？]', '', text)
         return text.strip()
     
-    def _extract_with_model(self, text: str) -> List[Dict[str, Any]]:
+    def _extract_with_model(self, text: str) -> List[Entity]:
         """使用预训练模型提取实体"""
         try:
             # 调用NER pipeline
@@ -115,13 +190,13 @@ class MedicalNERService:
             entities = []
             for result in ner_results:
                 if result['score'] >= self.confidence_threshold:
-                    entity = {
-                        'text': result['word'],
-                        'label': result['entity_group'],
-                        'confidence': round(result['score'], 3),
-                        'start': result['start'],
-                        'end': result['end']
-                    }
+                    entity = Entity(
+                        text=result['word'],
+                        label=result['entity_group'],
+                        confidence=round(result['score'], 3),
+                        start=result['start'],
+                        end=result['end']
+                    )
                     entities.append(entity)
             
             # 去重和合并相邻实体
@@ -133,7 +208,7 @@ class MedicalNERService:
             logger.error(f"模型提取实体失败: {e}")
             return self._extract_with_rules(text)
     
-    def _extract_with_rules(self, text: str) -> List[Dict[str, Any]]:
+    def _extract_with_rules(self, text: str) -> List[Entity]:
         """使用规则方法提取实体"""
         entities = []
         
@@ -141,22 +216,22 @@ class MedicalNERService:
             for keyword in keywords:
                 # 查找关键词在文本中的位置
                 for match in re.finditer(keyword, text):
-                    entity = {
-                        'text': keyword,
-                        'label': label,
-                        'confidence': 0.8,  # 规则方法给定默认置信度
-                        'start': match.start(),
-                        'end': match.end()
-                    }
+                    entity = Entity(
+                        text=keyword,
+                        label=label,
+                        confidence=0.8,  # 规则方法给定默认置信度
+                        start=match.start(),
+                        end=match.end()
+                    )
                     entities.append(entity)
         
         # 按位置排序并去重
-        entities = sorted(entities, key=lambda x: x['start'])
+        entities = sorted(entities, key=lambda x: x.start)
         entities = self._remove_overlapping_entities(entities)
         
         return entities
     
-    def _merge_adjacent_entities(self, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _merge_adjacent_entities(self, entities: List[Entity]) -> List[Entity]:
         """合并相邻的同类型实体"""
         if not entities:
             return entities
@@ -166,11 +241,11 @@ class MedicalNERService:
         
         for next_entity in entities[1:]:
             # 如果是相邻的同类型实体，则合并
-            if (current['label'] == next_entity['label'] and 
-                next_entity['start'] <= current['end'] + 2):
-                current['text'] += next_entity['text']
-                current['end'] = next_entity['end']
-                current['confidence'] = max(current['confidence'], next_entity['confidence'])
+            if (current.label == next_entity.label and 
+                next_entity.start <= current.end + 2):
+                current.text += next_entity.text
+                current.end = next_entity.end
+                current.confidence = max(current.confidence, next_entity.confidence)
             else:
                 merged.append(current)
                 current = next_entity
@@ -178,21 +253,21 @@ class MedicalNERService:
         merged.append(current)
         return merged
     
-    def _remove_overlapping_entities(self, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _remove_overlapping_entities(self, entities: List[Entity]) -> List[Entity]:
         """移除重叠的实体，保留置信度更高的"""
         if not entities:
             return entities
         
         # 按置信度降序排序
-        entities = sorted(entities, key=lambda x: x['confidence'], reverse=True)
+        entities = sorted(entities, key=lambda x: x.confidence, reverse=True)
         
         filtered = []
         for entity in entities:
             # 检查是否与已选择的实体重叠
             overlapped = False
             for selected in filtered:
-                if (entity['start'] < selected['end'] and 
-                    entity['end'] > selected['start']):
+                if (entity.start < selected.end and 
+                    entity.end > selected.start):
                     overlapped = True
                     break
             
@@ -200,9 +275,9 @@ class MedicalNERService:
                 filtered.append(entity)
         
         # 按位置重新排序
-        return sorted(filtered, key=lambda x: x['start'])
+        return sorted(filtered, key=lambda x: x.start)
     
-    def analyze_entities(self, entities: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze_entities(self, entities: List[Entity]) -> Dict[str, Any]:
         """分析提取的实体统计信息"""
         if not entities:
             return {
@@ -215,15 +290,15 @@ class MedicalNERService:
         # 统计各类型实体数量
         entity_types = {}
         entities_by_type = {}
-        confidences = [e['confidence'] for e in entities]
+        confidences = [e.confidence for e in entities]
         
         for entity in entities:
-            label = entity['label']
+            label = entity.label
             entity_types[label] = entity_types.get(label, 0) + 1
             
             if label not in entities_by_type:
                 entities_by_type[label] = []
-            entities_by_type[label].append(entity)
+            entities_by_type[label].append(entity.as_dict())
         
         return {
             'total_entities': len(entities),
@@ -236,38 +311,48 @@ class MedicalNERService:
             'entities_by_type': entities_by_type
         }
     
-    def highlight_entities(self, text: str, entities: List[Dict[str, Any]]) -> str:
+    def highlight_entities(self, text: str, entities: List[Entity]) -> str:
         """在原文中高亮显示识别的实体"""
         if not entities:
             return text
         
-        # 按位置倒序排序，避免插入标记时位置偏移
-        entities = sorted(entities, key=lambda x: x['start'], reverse=True)
-        
-        highlighted_text = text
-        color_map = {
-            'DISEASE': '#FF6B6B',
-            'SYMPTOM': '#4ECDC4', 
-            'BODY_PART': '#45B7D1',
-            'EXAMINATION': '#96CEB4',
-            'DRUG': '#FFEAA7',
-            'TREATMENT': '#DDA0DD'
-        }
+        # 按位置顺序拼接，只格式化随实体变化的部分
+        entities = sorted(entities, key=lambda x: x.start)
         
+        parts = []
+        pos = 0
         for entity in entities:
-            color = color_map.get(entity['label'], '#95A5A6')
-            start, end = entity['start'], entity['end']
-            original_text = highlighted_text[start:end]
+            start, end = entity.start, entity.end
+            if start < pos:
+                continue
             
-            confidence_str = entity['confidence']
-            highlighted = f'<span style="background-color: {color}; padding: 2px 4px; border-radius: 3px; color: white; font-weight: bold;" title="{entity["label"]} (置信度: {confidence_str})">{original_text}</span>'
+            prefix = self._span_prefixes.get(entity.label)
+            if prefix is None:
+                prefix = self._span_prefixes[entity.label] = self._build_span_prefix(entity.label, DEFAULT_ENTITY_COLOR)
             
-            highlighted_text = highlighted_text[:start] + highlighted + highlighted_text[end:]
+            parts.append(text[pos:start])
+            parts.append(prefix)
+            parts.append(f'{entity.confidence})">')
+            parts.append(text[start:end])
+            parts.append('</span>')
+            pos = end
         
-        return highlighted_text
+        parts.append(text[pos:])
+        return ''.join(parts)
     
-    def cleanup_resources(self) -> bool:
-        """清理NER模型资源"""
+    @staticmethod
+    def _build_span_prefix(label: str, color: str) -> str:
+        """构建高亮标签中不随置信度变化的前缀部分"""
+        return f'<span style="background-color: {color}; padding: 2px 4px; border-radius: 3px; color: white; font-weight: bold;" title="{label} (置信度: '
+    
+    def cleanup_resources(self, release_cuda_cache: bool = False) -> bool:
+        """
+        清理NER模型资源
+        
+        Args:
+            release_cuda_cache: 是否同时调用torch.cuda.empty_cache()归还显存，
+                该操作会触发设备同步，仅在需要立即释放显存时显式开启
+        """
         try:
             logger.info("正在清理NER模型资源...")
             
@@ -285,14 +370,10 @@ class MedicalNERService:
             if hasattr(self, 'medical_keywords'):
                 self.medical_keywords = None
             
-            # 尝试清理CUDA缓存
-            try:
-                import torch
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-                    logger.info("CUDA缓存已清理")
-            except ImportError:
-                pass
+            # 仅在显式请求时清理CUDA缓存
+            if release_cuda_cache and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+                logger.info("CUDA缓存已清理")
             
             logger.info("NER模型资源清理完成")
             return True
@@ -302,7 +383,7 @@ class MedicalNERService:
             return False
     
     def __del__(self):
-        """析构函数：确保资源被清理"""
+        """析构函数：释放模型引用，不触碰CUDA缓存（需要时显式调用cleanup_resources(release_cuda_cache=True)）"""
         try:
             self.cleanup_resources()
         except:
@@ -334,7 +415,7 @@ def main():
             if entities:
                 print(f"✅ 识别到 {len(entities)} 个实体:")
                 for entity in entities:
-                    print(f"  - {entity['text']} ({entity['label']}, 置信度: {entity['confidence']})")
+                    print(f"  - {entity.text} ({entity.label}, 置信度: {entity.confidence})")
                 
                 # 分析统计
                 stats = ner_service.analyze_entities(entities)
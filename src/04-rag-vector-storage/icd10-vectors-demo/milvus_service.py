@@ -2,23 +2,48 @@
 Milvus向量数据库服务模块
 """
 
+import json
 import logging
 from typing import List, Dict, Any, Optional
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
-from config import DATABASE_CONFIG, COLLECTION_SCHEMA, INDEX_CONFIG
+import numpy as np
+from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility, AsyncMilvusClient
+from config import DATABASE_CONFIG, COLLECTION_SCHEMA, INDEX_CONFIG, SCALAR_INDEX_CONFIG
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NGRAM_FIELD = "ngram_tokens"
+NGRAM_MAX_CAPACITY = next(
+    (f['max_capacity'] for f in COLLECTION_SCHEMA['fields'] if f['name'] == NGRAM_FIELD), 1024
+)
+
+
+def build_ngram_tokens(text: str, sizes=(2, 3)) -> List[str]:
+    """将文本切分为去重后的n-gram列表（保持出现顺序）"""
+    tokens = {}
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            tokens.setdefault(text[i:i + n], None)
+    return list(tokens)[:NGRAM_MAX_CAPACITY]
+
 
 class MilvusService:
     """Milvus向量数据库服务类"""
     
+    # 进程内共享的异步客户端（须在事件循环中首次创建）
+    _async_client: Optional[AsyncMilvusClient] = None
+    
     def __init__(self):
         self.host = DATABASE_CONFIG['milvus_host']
         self.port = DATABASE_CONFIG['milvus_port']
         self.collection_name = DATABASE_CONFIG['collection_name']
+        self.replica_number = DATABASE_CONFIG['replica_number']
         self.collection = None
+        self.index_type = INDEX_CONFIG['index_type']
+        self.vector_dtype = next(
+            np.float16 if f['type'] == 'FLOAT16_VECTOR' else np.float32
+            for f in COLLECTION_SCHEMA['fields'] if f['name'] == "embedding_vector"
+        )
         self._connect()
     
     def _connect(self):
@@ -40,6 +65,14 @@ class MilvusService:
             if utility.has_collection(self.collection_name):
                 logger.info(f"集合 {self.collection_name} 已存在")
                 self.collection = Collection(self.collection_name)
+                # 以已建索引的实际类型为准，保证搜索参数匹配
+                for index in self.collection.indexes:
+                    if index.field_name == "embedding_vector":
+                        self.index_type = index.params.get("index_type", self.index_type)
+                # 以已有集合的向量字段类型为准
+                for field in self.collection.schema.fields:
+                    if field.name == "embedding_vector":
+                        self.vector_dtype = np.float16 if field.dtype == DataType.FLOAT16_VECTOR else np.float32
                 return True
             
             # 构建字段Schema
@@ -60,10 +93,19 @@ class MilvusService:
                         max_length=field_config['max_length'],
                         description=field_config.get('description', '')
                     )
-                elif field_config['type'] == 'FLOAT_VECTOR':
+                elif field_config['type'] == 'ARRAY':
                     field = FieldSchema(
                         name=field_config['name'],
-                        dtype=DataType.FLOAT_VECTOR,
+                        dtype=DataType.ARRAY,
+                        element_type=getattr(DataType, field_config['element_type']),
+                        max_capacity=field_config['max_capacity'],
+                        max_length=field_config['max_length'],
+                        description=field_config.get('description', '')
+                    )
+                elif field_config['type'] in ('FLOAT_VECTOR', 'FLOAT16_VECTOR'):
+                    field = FieldSchema(
+                        name=field_config['name'],
+                        dtype=getattr(DataType, field_config['type']),
                         dim=field_config['dim'],
                         description=field_config.get('description', '')
                     )
@@ -86,29 +128,49 @@ class MilvusService:
             logger.error(f"创建集合失败: {e}")
             return False
     
-    def create_index(self) -> bool:
-        """为向量字段创建索引"""
+    def create_index(self, index_type: str = None) -> bool:
+        """
+        为向量字段创建索引，并为名称字段创建标量倒排索引
+        
+        Args:
+            index_type: 向量索引类型（HNSW / IVF_SQ8 / IVF_PQ / IVF_FLAT），默认取INDEX_CONFIG
+        """
         try:
             if not self.collection:
                 logger.error("集合未初始化")
                 return False
             
-            if self.collection.has_index():
-                logger.info("索引已存在")
-                return True
-            
-            index_params = {
-                "metric_type": INDEX_CONFIG["metric_type"],
-                "index_type": INDEX_CONFIG["index_type"],
-                "params": INDEX_CONFIG["params"]
-            }
+            indexes = {index.field_name: index for index in self.collection.indexes}
             
-            self.collection.create_index(
-                field_name="embedding_vector",
-                index_params=index_params
-            )
+            if "embedding_vector" in indexes:
+                self.index_type = indexes["embedding_vector"].params.get("index_type", self.index_type)
+                logger.info(f"向量索引已存在: {self.index_type}")
+            else:
+                self.index_type = index_type or INDEX_CONFIG["index_type"]
+                index_params = {
+                    "metric_type": INDEX_CONFIG["metric_type"],
+                    "index_type": self.index_type,
+                    "params": INDEX_CONFIG["params"][self.index_type]
+                }
+                
+                self.collection.create_index(
+                    field_name="embedding_vector",
+                    index_params=index_params
+                )
+                
+                logger.info(f"成功创建索引: {self.index_type}")
+            
+            # 标量倒排索引：名称检索不再需要全量扫描
+            schema_fields = {field.name for field in self.collection.schema.fields}
+            for field_name, index_type in SCALAR_INDEX_CONFIG.items():
+                if field_name in indexes or field_name not in schema_fields:
+                    continue
+                self.collection.create_index(
+                    field_name=field_name,
+                    index_params={"index_type": index_type}
+                )
+                logger.info(f"成功为字段 {field_name} 创建标量索引: {index_type}")
             
-            logger.info(f"成功创建索引: {INDEX_CONFIG['index_type']}")
             return True
             
         except Exception as e:
@@ -130,7 +192,9 @@ class MilvusService:
             disease_codes = [entity['disease_code'] for entity in entities]
             disease_names = [entity['disease_name'] for entity in entities]
             description_texts = [entity['description_text'] for entity in entities]
-            embedding_vectors = [entity['embedding_vector'] for entity in entities]
+            embedding_vectors = self.to_milvus_vectors(
+                np.asarray([entity['embedding_vector'] for entity in entities])
+            )
             chapter_names = [entity['chapter_name'] for entity in entities]
             section_names = [entity['section_name'] for entity in entities]
             
@@ -143,6 +207,9 @@ class MilvusService:
                 section_names
             ]
             
+            if self._has_ngram_field():
+                data.append([build_ngram_tokens(name) for name in disease_names])
+            
             self.collection.insert(data)
             self.collection.flush()
             
@@ -153,14 +220,33 @@ class MilvusService:
             logger.error(f"插入数据失败: {e}")
             return False
     
-    def load_collection(self) -> bool:
+    def to_milvus_vectors(self, vectors: np.ndarray) -> List:
+        """
+        将向量矩阵转换为Milvus接受的格式
+        
+        FLOAT16_VECTOR字段按行传入float16数组（直接序列化为字节，不经过Python float装箱），
+        FLOAT_VECTOR字段传入float列表。
+        """
+        if self.vector_dtype == np.float16:
+            return list(np.asarray(vectors, dtype=np.float16))
+        return np.asarray(vectors, dtype=np.float32).tolist()
+    
+    def build_search_params(self, limit: int, ef: int = 64, nprobe: int = 16) -> Dict[str, Any]:
+        """按向量索引类型构建搜索参数：HNSW使用ef（不小于4倍limit），IVF类索引使用nprobe"""
+        if self.index_type == "HNSW":
+            params = {"ef": max(ef, limit * 4)}
+        else:
+            params = {"nprobe": nprobe}
+        return {"metric_type": INDEX_CONFIG["metric_type"], "params": params}
+    
+    def load_collection(self, replica_number: int = None) -> bool:
         """加载集合到内存"""
         try:
             if not self.collection:
                 logger.error("集合未初始化")
                 return False
             
-            self.collection.load()
+            self.collection.load(replica_number=replica_number or self.replica_number)
             logger.info(f"成功加载集合到内存: {self.collection_name}")
             return True
             
@@ -168,6 +254,10 @@ class MilvusService:
             logger.error(f"加载集合失败: {e}")
             return False
     
+    def _has_ngram_field(self) -> bool:
+        """集合是否包含n-gram辅助字段（旧集合可能没有）"""
+        return any(field.name == NGRAM_FIELD for field in self.collection.schema.fields)
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """获取集合统计信息"""
         try:
@@ -188,18 +278,14 @@ class MilvusService:
     
     def search_vectors(self, vectors: List[List[float]], top_k: int = 10, 
                       search_params: Dict = None, output_fields: List[str] = None) -> List:
-        """向量相似度搜索"""
+        """向量相似度搜索，集合未初始化或搜索失败时抛出异常（不返回空结果，避免被当作0命中缓存）"""
         try:
             if not self.collection:
-                logger.error("集合未初始化")
-                return []
+                raise RuntimeError("集合未初始化")
             
             # 默认搜索参数
             if search_params is None:
-                search_params = {
-                    "metric_type": "IP",
-                    "params": {"nprobe": 16}
-                }
+                search_params = self.build_search_params(top_k)
             
             # 默认输出字段
             if output_fields is None:
@@ -219,8 +305,55 @@ class MilvusService:
             
         except Exception as e:
             logger.error(f"向量搜索失败: {e}")
+            raise
+    
+    def _get_async_client(self) -> AsyncMilvusClient:
+        """获取进程内共享的AsyncMilvusClient"""
+        if MilvusService._async_client is None:
+            MilvusService._async_client = AsyncMilvusClient(uri=f"http://{self.host}:{self.port}")
+            logger.info(f"已创建Milvus异步客户端: {self.host}:{self.port}")
+        return MilvusService._async_client
+    
+    async def search_vectors_async(self, vectors: List[List[float]], top_k: int = 10,
+                                   search_params: Dict = None, output_fields: List[str] = None) -> List:
+        """
+        异步向量相似度搜索
+        
+        多个集合或多组向量的检索可通过 asyncio.gather 并发发起，总延迟取决于最慢的一次请求。
+        返回结果为每个查询向量对应的命中列表，命中项为包含 id、distance、entity 的字典。
+        """
+        try:
+            # 默认搜索参数
+            if search_params is None:
+                search_params = self.build_search_params(top_k)
+            
+            # 默认输出字段
+            if output_fields is None:
+                output_fields = ["disease_code", "disease_name", "description_text", "chapter_name", "section_name"]
+            
+            results = await self._get_async_client().search(
+                collection_name=self.collection_name,
+                data=vectors,
+                anns_field="embedding_vector",
+                search_params=search_params,
+                limit=top_k,
+                output_fields=output_fields
+            )
+            
+            logger.info(f"异步向量搜索完成，返回 {len(results)} 组结果")
+            return results
+            
+        except Exception as e:
+            logger.error(f"异步向量搜索失败: {e}")
             return []
     
+    async def close_async_client(self):
+        """关闭进程内共享的异步客户端"""
+        if MilvusService._async_client is not None:
+            await MilvusService._async_client.close()
+            MilvusService._async_client = None
+            logger.info("Milvus异步客户端已关闭")
+    
     def query_by_code(self, disease_code: str) -> Optional[Dict[str, Any]]:
         """根据疾病编码精确查询"""
         try:
@@ -257,6 +390,12 @@ class MilvusService:
             # 构建查询表达式（模糊匹配）
             expr = f'disease_name like "%{disease_name}%"'
             
+            # 有n-gram字段时先用倒排索引筛选候选，like只作用于候选集
+            if len(disease_name) >= 2 and self._has_ngram_field():
+                n = 3 if len(disease_name) >= 3 else 2
+                query_tokens = build_ngram_tokens(disease_name, sizes=(n,))
+                expr = f'array_contains_all({NGRAM_FIELD}, {json.dumps(query_tokens, ensure_ascii=False)}) and {expr}'
+            
             # 执行查询
             results = self.collection.query(
                 expr=expr,
@@ -4,18 +4,101 @@
 集成NER实体识别和向量相似度检索，实现智能ICD-10编码匹配
 """
 
+import copy
+import heapq
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Hashable, Iterator
 import numpy as np
 
 from build_database import ICD10Vectorizer
 from milvus_service import MilvusService
-from medical_ner_service import MedicalNERService
+from medical_ner_service import MedicalNERService, Entity
 from config import SEARCH_CONFIG
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 纯数字/符号的查询不可能匹配ICD编码名称
+_DEGENERATE_QUERY_RE = re.compile(r'[\d\W]+')
+
+# 检索结果的文本字段，同时作为Milvus的output_fields
+RESULT_TEXT_FIELDS = ["disease_code", "disease_name", "description_text", "chapter_name", "section_name"]
+
+
+class LRUCache:
+    """线程安全的简单LRU缓存"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Any:
+        """命中时返回缓存值并刷新其位置，未命中返回None"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def put(self, key: Hashable, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TopKCollector:
+    """按疾病编码去重的Top-K收集器，用固定大小的小顶堆边接收命中边淘汰"""
+    
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        # 堆元素：[加权分数, -到达序号, 疾病编码, 命中对象, 原始分数, 权重]
+        # 同分时先到达的排在前面，后到达的先被淘汰
+        self._heap = []
+        self._entries = {}
+        self._counter = 0
+    
+    def add(self, hit, original_score: float, weight: float):
+        """接收一条命中，同一疾病编码只保留最高加权分数"""
+        weighted_score = original_score * weight
+        code = hit.entity.get('disease_code', '')
+        self._counter += 1
+        
+        entry = self._entries.get(code)
+        if entry is not None:
+            if weighted_score > entry[0]:
+                entry[:] = [weighted_score, -self._counter, code, hit, original_score, weight]
+                # 分数只升不降，堆不超过top_k个元素，直接重建即可
+                heapq.heapify(self._heap)
+            return
+        
+        entry = [weighted_score, -self._counter, code, hit, original_score, weight]
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap and weighted_score > self._heap[0][0]:
+            evicted = heapq.heapreplace(self._heap, entry)
+            del self._entries[evicted[2]]
+        else:
+            return
+        self._entries[code] = entry
+    
+    def ranked(self) -> List[Tuple[Any, float, float]]:
+        """按加权分数降序返回(命中对象, 原始分数, 权重)"""
+        return [(entry[3], entry[4], entry[5]) for entry in sorted(self._heap, reverse=True)]
+
 
 class SearchService:
     """智能检索服务类"""
@@ -30,6 +113,14 @@ class SearchService:
         self.default_top_k = SEARCH_CONFIG['default_top_k']
         self.score_threshold = SEARCH_CONFIG['score_threshold']
         self.nprobe = SEARCH_CONFIG['nprobe']
+        self.ef = SEARCH_CONFIG['ef']
+        self.search_mode = SEARCH_CONFIG['search_mode']
+        self.max_search_workers = SEARCH_CONFIG['max_search_workers']
+        self._search_executor = None
+        
+        # 查询向量缓存与检索结果缓存
+        self._embedding_cache = LRUCache(SEARCH_CONFIG['embedding_cache_size'])
+        self._result_cache = LRUCache(SEARCH_CONFIG['result_cache_size'])
         
         # 确保Milvus集合已加载
         self._ensure_collection_loaded()
@@ -47,9 +138,25 @@ class SearchService:
                 logger.warning("Milvus集合未成功加载，检索功能可能受影响")
             else:
                 logger.info("Milvus集合已成功加载")
+                # 后台预热，构造函数无需等待
+                self._warmup_thread = threading.Thread(target=self._warmup, name="search-warmup", daemon=True)
+                self._warmup_thread.start()
         except Exception as e:
             logger.error(f"加载Milvus集合失败: {e}")
     
+    def _warmup(self):
+        """预热向量化模型与Milvus索引，避免首个真实查询承担模型初始化和索引换入的开销"""
+        try:
+            warmup_vector = self.vectorizer.encode(["warmup"])
+            self.milvus_service.search_vectors(
+                vectors=self.milvus_service.to_milvus_vectors(warmup_vector),
+                top_k=1,
+                search_params=self.milvus_service.build_search_params(1, ef=self.ef, nprobe=self.nprobe)
+            )
+            logger.info("检索服务预热完成")
+        except Exception as e:
+            logger.warning(f"检索服务预热失败: {e}")
+    
     def search_icd_codes(self, 
                         query_text: str, 
                         top_k: int = None, 
@@ -71,10 +178,21 @@ class SearchService:
             if not query_text or not query_text.strip():
                 return self._empty_result("查询文本不能为空")
             
+            # 过短或无有效字符的查询直接返回，不调用NER和向量化
+            if self._is_degenerate_query(query_text):
+                return self._empty_result("查询文本过短或不包含有效内容")
+            
             # 设置默认参数
             top_k = top_k or self.default_top_k
             score_threshold = score_threshold or self.score_threshold
             
+            # 相同查询参数直接返回缓存结果
+            cache_key = (query_text, top_k, score_threshold, use_ner)
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中检索结果缓存，查询: '{query_text}'")
+                return copy.deepcopy(cached)
+            
             logger.info(f"开始检索ICD-10编码，查询: '{query_text}'")
             
             # 第一步：NER实体识别（可选）
@@ -86,34 +204,35 @@ class SearchService:
             # 第二步：构建检索查询
             search_queries = self._build_search_queries(query_text, entities, use_ner)
             
-            # 第三步：执行向量检索
-            all_results = []
-            for query_info in search_queries:
-                results = self._execute_vector_search(
-                    query_info['text'], 
-                    query_info['weight'],
-                    top_k, 
-                    score_threshold
-                )
-                all_results.extend(results)
-            
-            # 第四步：结果合并和排序
-            final_results = self._merge_and_rank_results(all_results, top_k)
+            # 第三步：执行向量检索（所有子查询一次向量化、一次检索），
+            # 第四步：命中逐条进入Top-K堆完成去重和排序
+            collector = TopKCollector(top_k)
+            for _, hit, original_score, weight in self._execute_vector_search(search_queries, top_k, score_threshold):
+                collector.add(hit, original_score, weight)
+            final_results = [self._build_result(*ranked) for ranked in collector.ranked()]
             
             # 第五步：格式化输出结果
-            return self._format_search_results(
+            result = self._format_search_results(
                 query_text, 
                 entities, 
                 final_results, 
                 top_k, 
                 score_threshold
             )
+            # 检索异常时不会执行到这里，失败结果不会写入缓存
+            self._result_cache.put(cache_key, copy.deepcopy(result))
+            return result
             
         except Exception as e:
             logger.error(f"检索失败: {e}")
             return self._empty_result(f"检索过程出现错误: {str(e)}")
     
-    def _build_search_queries(self, original_text: str, entities: List[Dict], use_ner: bool) -> List[Dict[str, Any]]:
+    def _is_degenerate_query(self, query_text: str) -> bool:
+        """判断查询是否过短或只包含数字和符号"""
+        text = query_text.strip()
+        return len(text) < 2 or _DEGENERATE_QUERY_RE.fullmatch(text) is not None
+    
+    def _build_search_queries(self, original_text: str, entities: List[Entity], use_ner: bool) -> List[Dict[str, Any]]:
         """构建检索查询"""
         queries = []
         
@@ -125,20 +244,25 @@ class SearchService:
         })
         
         if use_ner and entities:
-            # 实体查询：基于识别的医学实体
+            # 实体查询：基于识别的医学实体（单次遍历完成分类）
             entity_texts = []
+            disease_texts = []  # 疾病及症状实体
+            symptom_texts = []  # 症状实体
+            for e in entities:
+                label = e.label.lower()
+                is_symptom = 'symptom' in label
+                if is_symptom or 'disease' in label:
+                    disease_texts.append(e.text)
+                if is_symptom:
+                    symptom_texts.append(e.text)
             
             # 优先处理疾病名称
-            disease_entities = [e for e in entities if 'disease' in e['label'].lower() or 'symptom' in e['label'].lower()]
-            if disease_entities:
-                entity_text = ' '.join([e['text'] for e in disease_entities])
-                entity_texts.append(entity_text)
+            if disease_texts:
+                entity_texts.append(' '.join(disease_texts))
             
             # 添加症状相关实体
-            symptom_entities = [e for e in entities if 'symptom' in e['label'].lower()]
-            if symptom_entities:
-                symptom_text = ' '.join([e['text'] for e in symptom_entities])
-                entity_texts.append(symptom_text)
+            if symptom_texts:
+                entity_texts.append(' '.join(symptom_texts))
             
             # 为每个实体文本创建查询
             for i, entity_text in enumerate(entity_texts):
@@ -152,73 +276,110 @@ class SearchService:
         logger.info(f"构建了 {len(queries)} 个检索查询")
         return queries
     
-    def _execute_vector_search(self, query_text: str, weight: float, top_k: int, score_threshold: float) -> List[Dict]:
-        """执行单个向量检索"""
+    def _execute_vector_search(self, search_queries: List[Dict], top_k: int,
+                               score_threshold: float) -> Iterator[Tuple[int, Any, float, float]]:
+        """
+        批量执行向量检索：子查询一次性向量化，并在一次Milvus请求中检索
+        
+        逐条产出达到阈值的命中(子查询序号, 命中对象, 原始分数, 权重)，不在中间汇总结果列表。
+        向量化或检索出错时记录日志后抛出异常，由调用方返回错误结果（不缓存）。
+        """
         try:
-            # 向量化查询文本
-            query_vector = self.vectorizer.encode([query_text])
-            if query_vector.size == 0:
+            # 向量化全部查询文本
+            query_texts = [q['text'] for q in search_queries]
+            weights = [q['weight'] for q in search_queries]
+            query_vectors = self._encode_queries(query_texts)
+            if query_vectors.size == 0:
                 return []
             
-            # 执行Milvus检索
-            search_params = {
-                "metric_type": "IP",  # 内积相似度
-                "params": {"nprobe": self.nprobe}
-            }
+            # 执行Milvus检索（按索引类型设置ef/nprobe）
+            search_limit = top_k * 2  # 获取更多结果用于合并
+            search_params = self.milvus_service.build_search_params(search_limit, ef=self.ef, nprobe=self.nprobe)
             
-            results = self.milvus_service.search_vectors(
-                vectors=query_vector.tolist(),
-                top_k=top_k * 2,  # 获取更多结果用于合并
-                search_params=search_params,
-                output_fields=["disease_code", "disease_name", "description_text", "chapter_name", "section_name"]
-            )
+            output_fields = RESULT_TEXT_FIELDS
+            vectors = self.milvus_service.to_milvus_vectors(query_vectors)
+            
+            if self.search_mode == 'parallel' and len(vectors) > 1:
+                # 并行模式：每个子查询单独请求，在线程池中并发执行（gRPC调用期间释放GIL）
+                per_vector_results = self._get_search_executor().map(
+                    lambda vector: self.milvus_service.search_vectors(
+                        vectors=[vector],
+                        top_k=search_limit,
+                        search_params=search_params,
+                        output_fields=output_fields
+                    ),
+                    vectors
+                )
+                # 任一子查询失败时异常在此抛出，整个检索视为失败
+                results = [r[0] for r in per_vector_results]
+            else:
+                # 批量模式：所有子查询在一次请求中检索
+                results = self.milvus_service.search_vectors(
+                    vectors=vectors,
+                    top_k=search_limit,
+                    search_params=search_params,
+                    output_fields=output_fields
+                )
+            
+            # 处理检索结果：分数按子查询整体做阈值过滤，命中逐条交给调用方
+            total_hits = 0
+            for query_index, hits in enumerate(results):  # results[i]对应第i个查询向量的结果
+                weight = weights[query_index]
+                scores = np.asarray(hits.distances if hits else [], dtype=np.float64)
+                for i in np.flatnonzero(scores >= score_threshold):
+                    total_hits += 1
+                    yield query_index, hits[i], float(scores[i]), weight
             
-            # 处理检索结果
-            processed_results = []
-            if results and len(results) > 0:
-                for hit in results[0]:  # results[0]对应第一个查询向量的结果
-                    score = float(hit.score)
-                    if score >= score_threshold:
-                        result = {
-                            'id': hit.id,
-                            'score': score * weight,  # 应用权重
-                            'weighted_score': score * weight,
-                            'original_score': score,
-                            'query_weight': weight,
-                            'disease_code': hit.entity.get('disease_code', ''),
-                            'disease_name': hit.entity.get('disease_name', ''),
-                            'description_text': hit.entity.get('description_text', ''),
-                            'chapter_name': hit.entity.get('chapter_name', ''),
-                            'section_name': hit.entity.get('section_name', '')
-                        }
-                        processed_results.append(result)
-            
-            logger.info(f"查询 '{query_text}' 返回 {len(processed_results)} 个结果")
-            return processed_results
+            logger.info(f"{len(query_texts)} 个查询共返回 {total_hits} 个结果")
             
         except Exception as e:
             logger.error(f"向量检索失败: {e}")
-            return []
+            raise
     
-    def _merge_and_rank_results(self, all_results: List[Dict], top_k: int) -> List[Dict]:
-        """合并和排序检索结果"""
-        if not all_results:
-            return []
-        
-        # 按疾病编码去重，保留最高分数
-        unique_results = {}
-        for result in all_results:
-            code = result['disease_code']
-            if code not in unique_results or result['weighted_score'] > unique_results[code]['weighted_score']:
-                unique_results[code] = result
+    def _get_search_executor(self) -> ThreadPoolExecutor:
+        """获取并行检索使用的线程池（首次使用时创建）"""
+        if self._search_executor is None:
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=self.max_search_workers,
+                thread_name_prefix="milvus-search"
+            )
+        return self._search_executor
+    
+    def _encode_queries(self, query_texts: List[str]) -> np.ndarray:
+        """向量化查询文本，命中缓存的文本不再重复编码"""
+        cached_vectors = [self._embedding_cache.get(text) for text in query_texts]
+        missing_texts = list(dict.fromkeys(
+            text for text, vector in zip(query_texts, cached_vectors) if vector is None
+        ))
         
-        # 按加权分数排序
-        sorted_results = sorted(unique_results.values(), key=lambda x: x['weighted_score'], reverse=True)
+        if missing_texts:
+            encoded = self.vectorizer.encode(missing_texts)
+            if encoded.size == 0:
+                return encoded
+            new_vectors = dict(zip(missing_texts, encoded))
+            for text, vector in new_vectors.items():
+                self._embedding_cache.put(text, vector)
+            cached_vectors = [
+                vector if vector is not None else new_vectors[text]
+                for text, vector in zip(query_texts, cached_vectors)
+            ]
         
-        # 返回Top-K结果
-        return sorted_results[:top_k]
+        return np.stack(cached_vectors) if cached_vectors else np.array([])
     
-    def _format_search_results(self, query_text: str, entities: List[Dict], results: List[Dict], 
+    def _build_result(self, hit, original_score: float, weight: float) -> Dict:
+        """由Milvus命中对象构建结果字典"""
+        result = {
+            'id': hit.id,
+            'score': original_score * weight,  # 应用权重
+            'weighted_score': original_score * weight,
+            'original_score': original_score,
+            'query_weight': weight
+        }
+        for field in RESULT_TEXT_FIELDS:
+            result[field] = hit.entity.get(field, '')
+        return result
+    
+    def _format_search_results(self, query_text: str, entities: List[Entity], results: List[Dict], 
                              top_k: int, score_threshold: float) -> Dict[str, Any]:
         """格式化搜索结果"""
         
@@ -226,7 +387,7 @@ class SearchService:
         entity_stats = {}
         if entities:
             for entity in entities:
-                label = entity['label']
+                label = entity.label
                 entity_stats[label] = entity_stats.get(label, 0) + 1
         
         # 格式化结果列表
@@ -258,7 +419,7 @@ class SearchService:
             'ner_analysis': {
                 'entities_found': len(entities),
                 'entity_stats': entity_stats,
-                'entities': entities[:5]  # 只返回前5个实体
+                'entities': [e.as_dict() for e in entities[:5]]  # 只返回前5个实体
             },
             'results': formatted_results,
             'best_match': best_match,
@@ -325,24 +486,77 @@ class SearchService:
         }
     
     def batch_search(self, queries: List[str], top_k: int = None) -> List[Dict[str, Any]]:
-        """批量检索多个查询"""
-        results = []
+        """
+        批量检索多个查询
+        
+        所有查询的子查询合并为一次向量化和一次Milvus检索，再按所属查询分组合并排序。
+        """
         top_k = top_k or self.default_top_k
+        score_threshold = self.score_threshold
+        results = [None] * len(queries)
         
-        for query in queries:
-            result = self.search_icd_codes(query, top_k=top_k)
-            results.append(result)
+        try:
+            # 第一步：逐条NER并构建子查询，记录子查询所属的原始查询
+            query_entities = {}
+            flat_queries = []
+            owner_indices = []
+            for i, query in enumerate(queries):
+                if not query or not query.strip():
+                    results[i] = self._empty_result("查询文本不能为空")
+                    continue
+                
+                if self._is_degenerate_query(query):
+                    results[i] = self._empty_result("查询文本过短或不包含有效内容")
+                    continue
+                
+                cached = self._result_cache.get((query, top_k, score_threshold, True))
+                if cached is not None:
+                    results[i] = copy.deepcopy(cached)
+                    continue
+                
+                entities = self.ner_service.extract_entities(query)
+                query_entities[i] = entities
+                for query_info in self._build_search_queries(query, entities, True):
+                    flat_queries.append(query_info)
+                    owner_indices.append(i)
+            
+            # 第二步：一次向量化、一次检索，命中直接进入所属查询的Top-K堆
+            collectors = {i: TopKCollector(top_k) for i in query_entities}
+            if flat_queries:
+                for query_index, hit, original_score, weight in self._execute_vector_search(
+                        flat_queries, top_k, score_threshold):
+                    collectors[owner_indices[query_index]].add(hit, original_score, weight)
+            
+            # 第三步：按原始查询格式化
+            for i, entities in query_entities.items():
+                final_results = [self._build_result(*ranked) for ranked in collectors[i].ranked()]
+                results[i] = self._format_search_results(queries[i], entities, final_results, top_k, score_threshold)
+                self._result_cache.put((queries[i], top_k, score_threshold, True), copy.deepcopy(results[i]))
+            
+        except Exception as e:
+            logger.error(f"批量检索失败: {e}")
+            results = [r or self._empty_result(f"检索过程出现错误: {str(e)}") for r in results]
         
         return results
     
-    def cleanup_resources(self) -> bool:
-        """清理搜索服务资源"""
+    def cleanup_resources(self, release_cuda_cache: bool = False) -> bool:
+        """
+        清理搜索服务资源
+        
+        Args:
+            release_cuda_cache: 是否在释放模型后清理CUDA缓存
+        """
         try:
             logger.info("正在清理搜索服务资源...")
             
+            # 关闭并行检索线程池
+            if getattr(self, '_search_executor', None) is not None:
+                self._search_executor.shutdown(wait=False)
+                self._search_executor = None
+            
             # 清理向量化器
             if hasattr(self, 'vectorizer') and self.vectorizer is not None:
-                self.vectorizer.cleanup_resources()
+                self.vectorizer.cleanup_resources(release_cuda_cache=release_cuda_cache)
                 self.vectorizer = None
             
             # 清理Milvus服务
@@ -352,7 +566,7 @@ class SearchService:
             
             # 清理NER服务
             if hasattr(self, 'ner_service') and self.ner_service is not None:
-                self.ner_service.cleanup_resources()
+                self.ner_service.cleanup_resources(release_cuda_cache=release_cuda_cache)
                 self.ner_service = None
             
             logger.info("搜索服务资源清理完成")
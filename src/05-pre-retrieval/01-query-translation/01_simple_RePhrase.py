@@ -3,15 +3,16 @@
 展示查询重写的基本原理和效果
 """
 
-from openai import OpenAI
+import asyncio
+from openai import AsyncOpenAI
 import os
 from dotenv import load_dotenv
 
 # 加载.env文件中的环境变量，包括API密钥等敏感信息
 load_dotenv()
 
-# 初始化OpenAI客户端，指定DeepSeek URL
-client = OpenAI(
+# 初始化异步OpenAI客户端，指定DeepSeek URL
+client = AsyncOpenAI(
     base_url="https://api.deepseek.com", 
     api_key=os.getenv("DEEPSEEK_API_KEY")
 )
@@ -20,8 +21,13 @@ print("=" * 60)
 print("🔍 简单查询重写 - 基础版本")
 print("=" * 60)
 
-def rewrite_query(question: str) -> str:
+# 重写结果缓存（temperature=0，同一查询的重写结果可复用）
+_rewrite_cache = {}
+
+async def rewrite_query(question: str) -> str:
     """使用大模型重写查询"""
+    if question in _rewrite_cache:
+        return _rewrite_cache[question]
     
     prompt = f"""
 请将以下用户查询重写为更适合知识库检索的标准化表达：
@@ -39,12 +45,18 @@ def rewrite_query(question: str) -> str:
     """
 
     # 使用DeepSeek模型重写查询
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="deepseek-chat",
         messages=[{"role": "user", "content": prompt}],
         temperature=0,
     )
-    return response.choices[0].message.content.strip()
+    rewritten = response.choices[0].message.content.strip()
+    _rewrite_cache[question] = rewritten
+    return rewritten
+
+async def rewrite_queries(questions: list) -> list:
+    """并发重写多个查询，总耗时取决于最慢的一次请求"""
+    return await asyncio.gather(*[rewrite_query(q) for q in questions])
 
 # 测试多个查询案例
 test_cases = [
@@ -57,6 +69,9 @@ test_cases = [
 
 print(f"\n🚀 开始测试 {len(test_cases)} 个查询案例\n")
 
+print("🔄 正在并发重写全部查询...")
+rewritten_queries = asyncio.run(rewrite_queries(test_cases))
+
 for i, query in enumerate(test_cases, 1):
     print(f"{'='*50}")
     print(f"🧪 测试案例 {i}")
@@ -64,8 +79,7 @@ for i, query in enumerate(test_cases, 1):
     
     print(f"📝 原始查询: 「{query}」")
     
-    print("🔄 正在重写查询...")
-    rewritten = rewrite_query(query)
+    rewritten = rewritten_queries[i - 1]
     
     print(f"✨ 重写查询: 「{rewritten}」")
     
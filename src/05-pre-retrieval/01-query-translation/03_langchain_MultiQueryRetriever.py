@@ -7,11 +7,9 @@ import logging
 import os
 from dotenv import load_dotenv
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_deepseek import ChatDeepSeek
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from _shared import load_vectorstore
 
 # 加载.env文件中的环境变量，包括API密钥等敏感信息
 load_dotenv()
@@ -21,21 +19,8 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 multi_query_logger = logging.getLogger("langchain.retrievers.multi_query")
 multi_query_logger.setLevel(logging.DEBUG)
 
-print("\n📚 正在加载文档数据...")
-# 使用项目根目录的数据文件
-loader = TextLoader("data/txt/糖尿病.txt", encoding="utf-8")
-data = loader.load()
-print("✅ 文档加载完成")
-
-# 文本分块
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-all_splits = text_splitter.split_documents(data)
-
-# 向量存储
-print("\n🔤 正在构建向量存储...")
-embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-zh")
-vectorstore = Chroma.from_documents(documents=all_splits, embedding=embed_model)
-print("✅ 向量存储构建完成")
+# 向量存储（已持久化时直接加载）
+vectorstore = load_vectorstore()
 
 # 设置LLM
 llm = ChatDeepSeek(
@@ -3,15 +3,17 @@
 在多查询基础上增加智能排序，提供最优化的检索结果
 """
 
+import hashlib
 import logging
 import os
+import numpy as np
 from dotenv import load_dotenv
+from numba import njit, types
+from numba.typed import Dict
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_deepseek import ChatDeepSeek
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from _shared import load_vectorstore
 
 # 加载.env文件中的环境变量，包括API密钥等敏感信息
 load_dotenv()
@@ -21,21 +23,8 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 multi_query_logger = logging.getLogger("langchain.retrievers.multi_query")
 multi_query_logger.setLevel(logging.DEBUG)
 
-print("\n📚 正在加载文档数据...")
-# 使用项目根目录的数据文件
-loader = TextLoader("data/txt/糖尿病.txt", encoding="utf-8")
-data = loader.load()
-print("✅ 文档加载完成")
-
-# 文本分块
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-all_splits = text_splitter.split_documents(data)
-
-# 向量存储
-print("\n🔤 正在构建向量存储...")
-embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-zh")
-vectorstore = Chroma.from_documents(documents=all_splits, embedding=embed_model)
-print("✅ 向量存储构建完成")
+# 向量存储（已持久化时直接加载）
+vectorstore = load_vectorstore()
 
 # 设置LLM
 llm = ChatDeepSeek(
@@ -45,28 +34,57 @@ llm = ChatDeepSeek(
 # 创建RAG-Fusion检索器（基于MultiQueryRetriever的增强版）
 print("\n🛠️ 正在设置检索器...")
 
+@njit(cache=True)
+def rrf_scores(doc_ids, offsets, k):
+    """RRF分数累加（Numba编译）：doc_ids为各查询结果拼接后的文档ID，offsets[i]:offsets[i+1]为第i个查询的结果"""
+    fused_scores = Dict.empty(key_type=types.int64, value_type=types.float64)
+    for q in range(offsets.shape[0] - 1):
+        start = offsets[q]
+        for rank in range(offsets[q + 1] - start):
+            doc_id = doc_ids[start + rank]
+            # 使用RRF公式更新分数: 1 / (rank + k)
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1.0 / (rank + k)
+    
+    ids = np.empty(len(fused_scores), dtype=np.int64)
+    scores = np.empty(len(fused_scores), dtype=np.float64)
+    i = 0
+    for doc_id, score in fused_scores.items():
+        ids[i] = doc_id
+        scores[i] = score
+        i += 1
+    
+    # 按融合分数降序排序（稳定排序，同分保持首次出现顺序）
+    order = np.argsort(-scores, kind="mergesort")
+    return ids[order], scores[order]
+
+
+def doc_id(content: str) -> int:
+    """将文档内容哈希为64位整数ID"""
+    return int.from_bytes(hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
 class RAGFusionRetriever(MultiQueryRetriever):
     """RAG-Fusion检索器：继承MultiQueryRetriever并添加RRF排序"""
     
     def reciprocal_rank_fusion(self, results: list, k=60):
         """RRF算法：对多个检索结果进行融合排序"""
-        fused_scores = {}
-        
-        # 遍历每个查询的检索结果
+        # 文档内容只哈希一次，ID到文档的映射保留在Python层
+        id_to_doc = {}
+        doc_ids = []
+        offsets = [0]
         for docs in results:
-            # 遍历文档及其排名位置
-            for rank, doc in enumerate(docs):
-                # 将文档转换为字符串作为键
-                doc_str = doc.page_content
-                # 如果文档不在融合分数字典中，添加初始分数0
-                if doc_str not in fused_scores:
-                    fused_scores[doc_str] = {"score": 0, "doc": doc}
-                # 使用RRF公式更新分数: 1 / (rank + k)
-                fused_scores[doc_str]["score"] += 1 / (rank + k)
+            for doc in docs:
+                current_id = doc_id(doc.page_content)
+                id_to_doc.setdefault(current_id, doc)
+                doc_ids.append(current_id)
+            offsets.append(len(doc_ids))
         
-        # 按融合分数降序排序
-        sorted_results = sorted(fused_scores.values(), key=lambda x: x["score"], reverse=True)
-        return [item["doc"] for item in sorted_results]
+        sorted_ids, _ = rrf_scores(
+            np.array(doc_ids, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            k
+        )
+        return [id_to_doc[i] for i in sorted_ids.tolist()]
     
     def _get_relevant_documents(self, query: str, **kwargs):
         """重写检索方法，增加RRF融合排序"""
@@ -6,11 +6,9 @@
 import logging
 import os
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_deepseek import ChatDeepSeek
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from _shared import load_vectorstore
 
 # 加载.env文件中的环境变量，包括API密钥等敏感信息
 load_dotenv()
@@ -18,21 +16,8 @@ load_dotenv()
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-print("\n📚 正在加载文档数据...")
-# 使用项目根目录的数据文件
-loader = TextLoader("data/txt/糖尿病.txt", encoding="utf-8")
-data = loader.load()
-print("✅ 文档加载完成")
-
-# 文本分块
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-all_splits = text_splitter.split_documents(data)
-
-# 向量存储
-print("\n🔤 正在构建向量存储...")
-embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-zh")
-vectorstore = Chroma.from_documents(documents=all_splits, embedding=embed_model)
-print("✅ 向量存储构建完成")
+# 向量存储（已持久化时直接加载）
+vectorstore = load_vectorstore()
 
 # 设置LLM
 llm = ChatDeepSeek(
@@ -79,9 +64,14 @@ def query_decomposition_retrieve(complex_query, retriever, llm):
     all_docs = []
     all_docs_content = set()  # 用于去重
     
-    for i, sub_query in enumerate(sub_queries, 1):
+    # 所有子问题一次批量向量化，再按向量检索，避免逐个子问题重复编码
+    vectorstore = retriever.vectorstore
+    k = retriever.search_kwargs.get("k", 4)
+    sub_query_embeddings = vectorstore.embeddings.embed_documents(sub_queries)
+    
+    for i, (sub_query, embedding) in enumerate(zip(sub_queries, sub_query_embeddings), 1):
         print(f"\n   子问题{i}: {sub_query}")
-        docs = retriever.invoke(sub_query)
+        docs = vectorstore.similarity_search_by_vector(embedding, k=k)
         print(f"   检索到 {len(docs)} 个相关文档")
         
         # 去重添加文档
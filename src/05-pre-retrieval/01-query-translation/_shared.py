@@ -0,0 +1,85 @@
+"""
+查询翻译示例共用的向量存储
+首次运行时加载、分块并向量化文档，持久化到磁盘；再次运行直接加载，跳过向量化
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from langchain_chroma import Chroma
+from langchain_community.document_loaders import TextLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# 保证可以跨目录导入utils工具函数
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from utils.embeddings import get_embedder
+
+# 使用项目根目录的数据文件
+DATA_PATH = "data/txt/糖尿病.txt"
+PERSIST_ROOT = "data/chroma"
+EMBED_MODEL_NAME = "BAAI/bge-small-zh"
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+# 构建完成标记文件，目录存在但没有标记说明上次构建被中断
+BUILD_MARKER = ".build_complete"
+
+
+def get_embed_model():
+    """获取全局共享的向量化模型（同一进程只加载一次）"""
+    return get_embedder(EMBED_MODEL_NAME)
+
+
+def get_persist_dir():
+    """
+    向量存储的持久化目录
+    目录名包含数据文件修改时间、分块参数和模型名称的哈希，任一变化都会重新构建
+    """
+    key = f"{os.path.getmtime(DATA_PATH)}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{EMBED_MODEL_NAME}"
+    digest = hashlib.md5(key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(PERSIST_ROOT, f"diabetes_bge_small_zh_{digest}")
+
+
+def load_vectorstore():
+    """加载持久化的向量存储，不存在或上次构建未完成时重新构建并持久化"""
+    embed_model = get_embed_model()
+    persist_dir = get_persist_dir()
+    marker_path = os.path.join(persist_dir, BUILD_MARKER)
+
+    if os.path.exists(marker_path):
+        print("\n📦 正在加载已持久化的向量存储...")
+        vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embed_model)
+        print("✅ 向量存储加载完成")
+        return vectorstore
+
+    print("\n📚 正在加载文档数据...")
+    loader = TextLoader(DATA_PATH, encoding="utf-8")
+    data = loader.load()
+    print("✅ 文档加载完成")
+
+    # 文本分块
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    all_splits = text_splitter.split_documents(data)
+
+    # 向量存储
+    print("\n🔤 正在构建向量存储...")
+    shutil.rmtree(persist_dir, ignore_errors=True)
+    vectorstore = Chroma.from_documents(
+        documents=all_splits, embedding=embed_model, persist_directory=persist_dir
+    )
+    Path(marker_path).touch()
+    print("✅ 向量存储构建完成")
+    return vectorstore
+
+
+async def astream_answer(chain, inputs):
+    """流式调用链并逐段打印输出，返回完整回答文本"""
+    chunks = []
+    async for chunk in chain.astream(inputs):
+        print(chunk.content, end="", flush=True)
+        chunks.append(chunk.content)
+    print()
+    return "".join(chunks)
+
@@ -5,12 +5,13 @@
 这是一个基于内容分析的智能路由系统，可以自动识别查询内容并选择最合适的处理链。
 
 核心思想：
-1. 分析用户查询内容，识别编程语言类型
+1. 分析用户查询内容，识别编程语言类型（优先使用关键词规则，无法判断时才调用大模型）
 2. 根据识别结果，路由到相应的专门处理链
 3. 每个处理链针对特定编程语言优化，提供更精准的答案
 """
 
 import os
+import re
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_deepseek import ChatDeepSeek
@@ -43,16 +44,33 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}"),
 ])
 
+# 关键词路由规则：用前后非英文字母代替\b，兼容中英文混排（如"Go语言"），允许复数形式（如goroutines）
+# 只收录不会与普通英文单词混淆的名称（go、node、gin、pip、react等交给大模型判断）
+KEYWORDS = {
+    "python_docs": re.compile(r"(?<![a-z])(python|langchain|pandas|django|numpy)s?(?![a-z])", re.I),
+    "js_docs": re.compile(r"(?<![a-z])(javascript|typescript|node\.?js|vue|npm)s?(?![a-z])", re.I),
+    "golang_docs": re.compile(r"(?<![a-z])(golang|goroutine|go语言)s?(?![a-z])", re.I),
+}
+
 def route_query(question: str) -> str:
     """
     根据问题内容进行路由分析
     
+    先用关键词规则判断，只有规则无法命中时才调用大模型
+    
     Args:
         question: 用户提出的问题
         
     Returns:
         str: 路由到的数据源名称
     """
+    matched = [route for route, pattern in KEYWORDS.items() if pattern.search(question)]
+    if len(matched) == 1:
+        return matched[0]
+    if len(matched) > 1:
+        # 涉及多种语言
+        return "general_docs"
+    
     # 构建结构化提示
     formatted_prompt = prompt.invoke({'question': question})
     
@@ -18,22 +18,24 @@
 """
 
 import os
+import sys
+from functools import lru_cache
+from pathlib import Path
 import numpy as np
 from dotenv import load_dotenv
-from langchain.utils.math import cosine_similarity
 from langchain_core.prompts import PromptTemplate
 from langchain_deepseek import ChatDeepSeek
-from langchain_huggingface import HuggingFaceEmbeddings
+
+# 保证可以跨目录导入utils工具函数
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from utils.embeddings import get_embedder
+from utils.semantic_cache import SemanticCache
 
 # 加载环境变量
 load_dotenv()
 
-# 初始化嵌入模型 - 使用中文优化的模型
-embeddings = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-small-zh",  # 使用中文优化的嵌入模型
-    model_kwargs={'device': 'cpu'},   # 使用CPU计算
-    encode_kwargs={'normalize_embeddings': True}  # 启用向量归一化
-)
+# 初始化嵌入模型 - 使用中文优化的模型（全局共享实例，向量已归一化）
+embeddings = get_embedder("BAAI/bge-small-zh")
 
 # 定义不同领域的专门化提示模板
 physics_template = """你是一位非常优秀的物理学教授。\
@@ -76,6 +78,13 @@ print("🔄 正在计算提示模板的向量嵌入...")
 # 计算所有提示模板的向量嵌入
 template_texts = [template for _, template in prompt_templates]
 prompt_embeddings = embeddings.embed_documents(template_texts)
+# 转为连续的float32矩阵 (K, D)，向量已归一化，点积即余弦相似度
+PROMPT_EMB = np.ascontiguousarray(np.asarray(prompt_embeddings, dtype=np.float32))
+del prompt_embeddings, template_texts
+
+# 领域名称与编译好的提示模板，与PROMPT_EMB的行一一对应
+DOMAIN_NAMES = tuple(name for name, _ in prompt_templates)
+PROMPTS = tuple(PromptTemplate.from_template(template) for _, template in prompt_templates)
 print("✅ 提示模板向量化完成")
 
 # 初始化DeepSeek大语言模型
@@ -86,6 +95,11 @@ llm = ChatDeepSeek(
     api_key=os.getenv("DEEPSEEK_API_KEY")
 )
 
+@lru_cache(maxsize=1024)
+def _embed_cached(text: str) -> tuple:
+    """带LRU缓存的查询向量化，重复查询无需再次推理（向量已归一化，可直接复用）"""
+    return tuple(embeddings.embed_query(text))
+
 def prompt_router(user_input: str):
     """
     基于语义相似度的提示路由器
@@ -99,33 +113,36 @@ def prompt_router(user_input: str):
     print(f"\n🔍 正在分析查询: {user_input[:50]}{'...' if len(user_input) > 50 else ''}")
     
     # 1. 将用户查询进行向量化
-    query_embedding = embeddings.embed_query(user_input)
+    query_embedding = np.asarray(_embed_cached(user_input), dtype=np.float32)
     
-    # 2. 计算查询与所有提示模板的余弦相似度
-    similarity_scores = cosine_similarity([query_embedding], prompt_embeddings)[0]
+    # 2. 计算查询与所有提示模板的余弦相似度（归一化向量的点积）
+    similarity_scores = PROMPT_EMB @ query_embedding
     
     # 3. 找到相似度最高的模板
     best_match_idx = np.argmax(similarity_scores)
     best_score = similarity_scores[best_match_idx]
     
-    # 4. 获取最匹配的领域和模板
-    domain_name, most_similar_template = prompt_templates[best_match_idx]
+    # 4. 获取最匹配的领域
+    domain_name = DOMAIN_NAMES[best_match_idx]
     
     # 5. 显示路由信息
     print(f"📊 相似度分数:")
-    for i, (domain, _) in enumerate(prompt_templates):
+    for i, domain in enumerate(DOMAIN_NAMES):
         score = similarity_scores[i]
         marker = "👉 " if i == best_match_idx else "   "
         print(f"{marker}{domain}: {score:.4f}")
     
     print(f"\n🎯 选择领域: {domain_name} (相似度: {best_score:.4f})")
     
-    # 6. 创建提示模板对象并格式化
-    template = PromptTemplate.from_template(most_similar_template)
-    formatted_prompt = template.invoke({'query': user_input})
+    # 6. 使用预编译的提示模板格式化
+    formatted_prompt = PROMPTS[best_match_idx].invoke({'query': user_input})
     
     return domain_name, formatted_prompt
 
+# 语义响应缓存：问题向量与历史问题的相似度达到阈值时直接复用回答
+RESPONSE_CACHE_THRESHOLD = 0.95
+response_cache = SemanticCache(threshold=RESPONSE_CACHE_THRESHOLD)
+
 def semantic_routing_qa(user_query: str) -> str:
     """
     完整的语义路由问答流程
@@ -134,16 +151,31 @@ def semantic_routing_qa(user_query: str) -> str:
         user_query: 用户查询
         
     Returns:
-        str: 大模型的回答
+        str: 大模型的回答（同时流式输出到终端）
     """
-    # 1. 路由到最适合的提示模板
+    # 1. 查询语义缓存（向量已归一化，内积即余弦相似度）
+    query_embedding = np.asarray(_embed_cached(user_query), dtype=np.float32)
+    cached = response_cache.lookup(query_embedding)
+    if cached is not None:
+        print("\n⚡ 命中语义缓存")
+        print(f"\n💬 系统回答:\n{cached}")
+        return cached
+    
+    # 2. 路由到最适合的提示模板
     domain, refined_prompt = prompt_router(user_query)
     
-    # 2. 使用DeepSeek生成回答
+    # 3. 使用DeepSeek流式生成回答，边生成边输出
     print(f"\n🤖 正在使用{domain}专家模式生成回答...")
-    response = llm.invoke(refined_prompt)
+    print("\n💬 系统回答:")
+    chunks = []
+    for chunk in llm.stream(refined_prompt):
+        print(chunk.content, end="", flush=True)
+        chunks.append(chunk.content)
+    print()
+    answer = "".join(chunks)
     
-    return response.content
+    response_cache.add(query_embedding, answer)
+    return answer
 
 def main():
     """主函数：演示语义路由系统"""
@@ -165,8 +197,7 @@ def main():
         
         try:
             # 执行语义路由问答
-            answer = semantic_routing_qa(query)
-            print(f"\n💬 系统回答:\n{answer}")
+            semantic_routing_qa(query)
             
         except Exception as e:
             print(f"❌ 处理过程中出现错误: {e}")
@@ -191,8 +222,7 @@ def interactive_mode():
                 continue
             
             # 执行语义路由问答
-            answer = semantic_routing_qa(user_input)
-            print(f"\n💬 系统回答:\n{answer}")
+            semantic_routing_qa(user_input)
             
         except KeyboardInterrupt:
             print("\n👋 感谢使用语义路由系统！")
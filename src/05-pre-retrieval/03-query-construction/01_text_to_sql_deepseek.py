@@ -6,13 +6,64 @@ Text-to-SQL查询构建系统 - DeepSeek版本
 
 import sqlite3
 import os
+import re
+import sys
+from pathlib import Path
+import numpy as np
 from dotenv import load_dotenv
 from langchain_deepseek import ChatDeepSeek
 from langchain_core.prompts import ChatPromptTemplate
 
+# 保证可以跨目录导入utils工具函数
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from utils.embeddings import get_embedder
+
 # 加载环境变量
 load_dotenv()
 
+# 数据库schema信息
+SCHEMA_INFO = """
+    数据库Schema信息：
+    
+    表名: sales_data
+    字段说明:
+    - id: INTEGER PRIMARY KEY (主键，自增)
+    - product_name: TEXT (产品名称)
+    - quantity: INTEGER (销售数量)
+    - sale_date: TEXT (销售日期，格式：YYYY-MM-DD)
+    - revenue: REAL (销售收入)
+    - region: TEXT (销售区域)
+    - customer_type: TEXT (客户类型：个人/企业)
+"""
+
+# 匹配模型输出中的markdown代码块（支持```sql、```sqlite等语言标记）
+_SQL_FENCE_RE = re.compile(
+    r"^\s*```(?:sqlite|sql)?\s*\n?(.*?)\n?```\s*$", re.DOTALL | re.IGNORECASE
+)
+
+# 语义缓存命中阈值：自然语言查询向量的余弦相似度
+SQL_CACHE_THRESHOLD = 0.97
+
+# 查询中的字面量：数字、英文/型号词、中文数字（语义缓存要求两次查询的字面量完全相同）
+_QUERY_LITERAL_RE = re.compile(r"\d+(?:\.\d+)?|[A-Za-z][A-Za-z0-9]*|[零一二两三四五六七八九十百千万]+")
+
+# SQL中的字符串常量，如 '北京'、'%iPhone 15%'
+_SQL_STRING_RE = re.compile(r"'((?:[^']|'')*)'")
+
+# SQL生成提示模板
+SQL_PROMPT_TEMPLATE = """
+你是一个专业的SQL查询生成专家。基于以下数据库schema，将用户的自然语言查询转换为准确的SQL语句。
+{schema}
+规则要求：
+1. 只生成SQL语句，不要包含任何解释文字
+2. 确保SQL语法正确且符合SQLite标准
+3. 使用适当的聚合函数、WHERE条件、GROUP BY、ORDER BY等
+4. 日期比较请使用字符串比较（如：sale_date >= '2023-07-01'）
+5. 产品名称匹配请使用LIKE操作符支持模糊查询
+6. 如果查询涉及时间范围，请合理解释季度、月份等时间概念
+用户查询: {query}
+SQL语句:"""
+
 
 class TextToSQLConverter:
     """文本到SQL转换器"""
@@ -28,11 +79,42 @@ class TextToSQLConverter:
         self.conn = None
         self.cursor = None
 
+        # 模型、提示模板和调用链只初始化一次，所有查询复用
+        self.llm = ChatDeepSeek(
+            model="deepseek-chat",
+            temperature=0.1,  # 设置较低温度确保SQL生成的准确性
+            max_tokens=1024,
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+        )
+        self.sql_prompt = ChatPromptTemplate.from_template(SQL_PROMPT_TEMPLATE)
+        self._sql_chain = self.sql_prompt | self.llm
+        self._schema_info = SCHEMA_INFO
+
+        # 两级SQL缓存：自然语言查询完全匹配，以及查询向量语义匹配
+        # 新生成的SQL先记入待缓存表，执行成功后才写入缓存
+        self.embeddings = get_embedder("BAAI/bge-small-zh")
+        self._sql_cache = {}
+        self._nl_emb = []
+        self._nl_queries = []
+        self._nl_literals = []
+        self._nl_sql = []
+        self._pending_sql = {}
+        self._literal_values = None
+
     def connect_database(self):
         """连接数据库"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # 自动提交模式，写入时显式开启事务；放大语句缓存，重复查询无需重新编译
+            self.conn = sqlite3.connect(
+                self.db_path,
+                isolation_level=None,
+                cached_statements=256,
+                check_same_thread=False,
+            )
             self.cursor = self.conn.cursor()
+            self.cursor.executescript(
+                "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY;"
+            )
             print(f"✅ 成功连接数据库: {self.db_path}")
         except Exception as e:
             print(f"❌ 数据库连接失败: {e}")
@@ -56,6 +138,9 @@ class TextToSQLConverter:
             """
             )
 
+            # 清空和插入数据在同一个事务中完成
+            self.cursor.execute("BEGIN")
+
             # 清空现有数据
             self.cursor.execute("DELETE FROM sales_data")
 
@@ -81,7 +166,7 @@ class TextToSQLConverter:
                 sample_data,
             )
 
-            self.conn.commit()
+            self.cursor.execute("COMMIT")
             print("✅ 示例数据库和数据创建成功")
 
             # 显示数据统计
@@ -90,13 +175,40 @@ class TextToSQLConverter:
             print(f"📊 数据库中共有 {count} 条销售记录")
 
         except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
             print(f"❌ 数据库创建失败: {e}")
             raise
 
+    def _query_literals(self, natural_query):
+        """
+        提取查询中的字面量：数字、英文词、中文数字，以及数据库中出现过的地区和客户类型
+        数据库取值无法读取时返回None，此时不使用语义缓存
+        """
+        if self._literal_values is None:
+            try:
+                self.cursor.execute(
+                    "SELECT DISTINCT region FROM sales_data UNION SELECT DISTINCT customer_type FROM sales_data"
+                )
+                self._literal_values = [row[0] for row in self.cursor.fetchall()]
+            except Exception:
+                return None
+
+        literals = _QUERY_LITERAL_RE.findall(natural_query)
+        literals.extend(value for value in self._literal_values if value in natural_query)
+        return tuple(sorted(literals))
+
+    def _sql_fits_query(self, sql_query, natural_query):
+        """缓存SQL中的文本常量（日期、数字除外）都必须出现在新查询中，避免套用其他查询的过滤条件"""
+        for literal in _SQL_STRING_RE.findall(sql_query):
+            literal = literal.replace("''", "'").strip("%")
+            if literal and not re.fullmatch(r"[\d\-.:/ ]+", literal) and literal not in natural_query:
+                return False
+        return True
+
     def generate_sql(self, natural_query):
         """
         使用DeepSeek模型生成SQL查询
-        将所有SQL生成相关的初始化和配置集中在此函数中，便于理解整个生成流程
 
         Args:
             natural_query (str): 自然语言查询
@@ -105,65 +217,42 @@ class TextToSQLConverter:
             str: 生成的SQL语句
         """
         try:
-            print("🔧 步骤1: 初始化DeepSeek模型...")
-            # 初始化DeepSeek模型
-            llm = ChatDeepSeek(
-                model="deepseek-chat",
-                temperature=0.1,  # 设置较低温度确保SQL生成的准确性
-                max_tokens=1024,
-                api_key=os.getenv("DEEPSEEK_API_KEY"),
+            # 第一级缓存：完全相同的查询
+            cached_sql = self._sql_cache.get(natural_query)
+            if cached_sql is not None:
+                print("⚡ 命中SQL缓存（相同查询）")
+                return cached_sql
+
+            # 第二级缓存：语义相近且字面量完全相同的查询（向量已归一化，内积即余弦相似度）
+            query_embedding = np.asarray(
+                self.embeddings.embed_query(natural_query), dtype=np.float32
             )
+            literals = self._query_literals(natural_query)
+            if self._nl_emb and literals is not None:
+                sims = np.stack(self._nl_emb) @ query_embedding
+                best = int(sims.argmax())
+                if (
+                    sims[best] >= SQL_CACHE_THRESHOLD
+                    and self._nl_literals[best] == literals
+                    and self._sql_fits_query(self._nl_sql[best], natural_query)
+                ):
+                    print(
+                        f"⚡ 命中SQL缓存（相似查询: {self._nl_queries[best]}，相似度: {sims[best]:.4f}）"
+                    )
+                    return self._nl_sql[best]
 
-            print("📋 步骤2: 准备数据库Schema信息...")
-            # 数据库schema信息
-            schema_info = """
-                数据库Schema信息：
-                
-                表名: sales_data
-                字段说明:
-                - id: INTEGER PRIMARY KEY (主键，自增)
-                - product_name: TEXT (产品名称)
-                - quantity: INTEGER (销售数量)
-                - sale_date: TEXT (销售日期，格式：YYYY-MM-DD)
-                - revenue: REAL (销售收入)
-                - region: TEXT (销售区域)
-                - customer_type: TEXT (客户类型：个人/企业)
-            """
-
-            print("📝 步骤3: 创建SQL生成提示模板...")
-            # 创建SQL生成提示模板
-            sql_prompt = ChatPromptTemplate.from_template(
-                """
-你是一个专业的SQL查询生成专家。基于以下数据库schema，将用户的自然语言查询转换为准确的SQL语句。
-{schema}
-规则要求：
-1. 只生成SQL语句，不要包含任何解释文字
-2. 确保SQL语法正确且符合SQLite标准
-3. 使用适当的聚合函数、WHERE条件、GROUP BY、ORDER BY等
-4. 日期比较请使用字符串比较（如：sale_date >= '2023-07-01'）
-5. 产品名称匹配请使用LIKE操作符支持模糊查询
-6. 如果查询涉及时间范围，请合理解释季度、月份等时间概念
-用户查询: {query}
-SQL语句:"""
-            )
-
-            print("⚙️ 步骤4: 格式化提示词...")
-            # 格式化提示词
-            formatted_prompt = sql_prompt.format(
-                schema=schema_info, query=natural_query
-            )
-
-            print("🤖 步骤5: 调用DeepSeek模型生成SQL...")
             # 调用DeepSeek模型生成SQL
-            response = llm.invoke(formatted_prompt)
-            sql_query = response.content.strip()
+            response = self._sql_chain.invoke(
+                {"schema": self._schema_info, "query": natural_query}
+            )
+            sql_query = response.content
 
-            print("✨ 步骤6: 清理和格式化SQL语句...")
             # 清理SQL语句（移除可能的markdown格式）
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-            elif sql_query.startswith("```"):
-                sql_query = sql_query.replace("```", "").strip()
+            match = _SQL_FENCE_RE.match(sql_query)
+            sql_query = (match.group(1) if match else sql_query).strip()
+
+            # 执行成功后再由cache_sql写入缓存
+            self._pending_sql[natural_query] = (query_embedding, literals, sql_query)
 
             print("✅ SQL生成完成!")
             return sql_query
@@ -172,6 +261,19 @@ SQL语句:"""
             print(f"❌ SQL生成失败: {e}")
             return None
 
+    def cache_sql(self, natural_query, sql_query):
+        """SQL执行成功后写入两级缓存；命中缓存得到的SQL不会重复写入"""
+        pending = self._pending_sql.pop(natural_query, None)
+        if pending is None or pending[2] != sql_query:
+            return
+        query_embedding, literals, _ = pending
+        self._sql_cache[natural_query] = sql_query
+        if literals is not None:
+            self._nl_emb.append(query_embedding)
+            self._nl_queries.append(natural_query)
+            self._nl_literals.append(literals)
+            self._nl_sql.append(sql_query)
+
     def execute_sql(self, sql_query):
         """
         执行SQL查询
@@ -209,14 +311,17 @@ SQL语句:"""
         if not results:
             return "查询结果为空"
 
+        # 所有单元格只转换一次字符串
+        rows_str = [
+            [str(cell) if cell is not None else "NULL" for cell in row]
+            for row in results
+        ]
+
         # 计算每列的最大宽度
-        col_widths = []
-        for i, col_name in enumerate(column_names):
-            max_width = len(col_name)
-            for row in results:
-                if i < len(row) and row[i] is not None:
-                    max_width = max(max_width, len(str(row[i])))
-            col_widths.append(max_width + 2)
+        col_widths = [
+            max(len(col_name), *(len(row[i]) for row in rows_str)) + 2
+            for i, col_name in enumerate(column_names)
+        ]
 
         # 构建格式化字符串
         formatted_output = []
@@ -229,10 +334,9 @@ SQL语句:"""
         formatted_output.append("-" * len(header))
 
         # 数据行
-        for row in results:
+        for row in rows_str:
             row_str = "|".join(
-                f"{str(cell) if cell is not None else 'NULL':<{width}}"
-                for cell, width in zip(row, col_widths)
+                f"{cell:<{width}}" for cell, width in zip(row, col_widths)
             )
             formatted_output.append(row_str)
 
@@ -267,9 +371,12 @@ SQL语句:"""
         results, column_names = self.execute_sql(sql_query)
 
         if results is None:
+            self._pending_sql.pop(natural_query, None)
             print("❌ 查询执行失败")
             return
 
+        self.cache_sql(natural_query, sql_query)
+
         # 显示结果
         print("📊 查询结果:")
         if results:
@@ -4,10 +4,14 @@ Text-to-Cypher 自然语言转Cypher查询系统
 支持医疗知识图谱的自然语言查询转换
 """
 
+import asyncio
 from neo4j import GraphDatabase
+from neo4j.exceptions import CypherSyntaxError
 import os
+import time
+import hashlib
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import re
 import json
 from typing import Dict, List, Any, Tuple
@@ -15,6 +19,109 @@ from typing import Dict, List, Any, Tuple
 # 加载环境变量
 load_dotenv()
 
+# 数据库模式缓存的有效期（秒），过期后重新从数据库读取
+SCHEMA_CACHE_TTL = 24 * 3600
+
+# 生成的Cypher查询缓存文件及最大条目数
+CYPHER_CACHE_PATH = os.path.join(os.path.expanduser("~/.cache"), "tc_cypher.json")
+CYPHER_CACHE_MAX_SIZE = 1024
+
+# 清理LLM输出中的Markdown代码块标记
+_CYPHER_FENCE_RE = re.compile(r'```(?:cypher)?\n?')
+
+
+def _cypher_complete(text: str) -> bool:
+    """判断流式输出是否已包含完整的Cypher语句：代码块已闭合，或已出现语句结束符"""
+    body = text.lstrip()
+    if body.startswith("```"):
+        return body.count("```") >= 2
+    return ";" in body
+
+
+# name属性上有唯一约束（见02_build_neo4j_testdata.py）的节点标签
+_NAME_INDEXED_NODE_RE = re.compile(r'\((\w+):(Disease|Symptom|Drug)\b')
+_MATCH_RE = re.compile(r'\bMATCH\b', re.IGNORECASE)
+_HINT_POSITION_RE = re.compile(r'\b(?:WHERE|WITH|RETURN)\b', re.IGNORECASE)
+_WHERE_CLAUSE_RE = re.compile(
+    r'\bWHERE\b(.*?)(?=\b(?:RETURN|WITH|ORDER|UNWIND|CALL|SET|DELETE|MERGE|CREATE)\b|$)', re.IGNORECASE | re.DOTALL
+)
+_NON_CONJUNCTION_RE = re.compile(r'\b(?:OR|XOR|NOT)\b', re.IGNORECASE)
+
+
+def _add_index_hints(cypher: str) -> str:
+    """
+    为按name精确匹配的节点补充USING INDEX提示，避免规划器退化为按标签全量扫描
+    只处理单个MATCH子句的语句；toLower()/CONTAINS等无法走索引查找的条件不加提示，否则查询会报错
+    WHERE条件只在全部由AND连接（不含OR/NOT）且等值比较的是常量或参数时才加提示，其余情况Neo4j同样会拒绝提示
+    """
+    if len(_MATCH_RE.findall(cypher)) != 1 or re.search(r'\bUSING\s+INDEX\b', cypher, re.IGNORECASE):
+        return cypher
+    
+    where = _WHERE_CLAUSE_RE.search(cypher)
+    where_text = where.group(1) if where and not _NON_CONJUNCTION_RE.search(where.group(1)) else ""
+    
+    hints = []
+    for alias, label in dict(_NAME_INDEXED_NODE_RE.findall(cypher)).items():
+        alias_re = re.escape(alias)
+        equality = re.search(
+            rf'(?<![\w(.]){alias_re}\.name\s*(?:=(?!~)\s*(?:\'|"|\$)|IN\s*(?:\[|\$))', where_text, re.IGNORECASE
+        )
+        map_pattern = re.search(rf'\({alias_re}:{label}\s*\{{\s*name\s*:', cypher)
+        if equality or map_pattern:
+            hints.append(f"USING INDEX {alias}:{label}(name)")
+    if not hints:
+        return cypher
+    
+    position = _HINT_POSITION_RE.search(cypher, _MATCH_RE.search(cypher).end())
+    if position is None:
+        return cypher
+    head, tail = cypher[:position.start()].rstrip(), cypher[position.start():]
+    return f"{head}\n" + "\n".join(hints) + f"\n{tail}"
+
+
+# 常见问法的Cypher模板，命中时直接绑定参数执行，无需调用LLM（按顺序匹配）
+_CYPHER_TEMPLATES = [
+    (
+        re.compile(r"(?:什么|哪些)药物?(?:可以|能)?治疗(.+)"),
+        "MATCH (drug:Drug)-[:TREATS]->(d:Disease) WHERE d.name CONTAINS $x RETURN drug.name, drug.type, drug.dosage"
+    ),
+    (
+        re.compile(r"(?:查找|查询)?(.+?)的治疗药物"),
+        "MATCH (drug:Drug)-[:TREATS]->(d:Disease) WHERE d.name CONTAINS $x RETURN drug.name, drug.type, drug.dosage"
+    ),
+    (
+        re.compile(r"(.+?)(?:可以|能)治疗(?:什么|哪些)疾病"),
+        "MATCH (drug:Drug)-[:TREATS]->(d:Disease) WHERE drug.name CONTAINS $x RETURN drug.name, d.name, d.type"
+    ),
+    (
+        re.compile(r"(.+?)可能是(?:哪些|什么)疾病的症状"),
+        "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name CONTAINS $x RETURN s.name, d.name, d.type"
+    ),
+    (
+        re.compile(r"(?:哪些|什么)疾病会(?:导致|引起)(.+)"),
+        "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name CONTAINS $x RETURN s.name, d.name, d.type"
+    ),
+    (
+        re.compile(r"(?:查找|查询)?(.+?)的(?:所有|主要)?症状(?:有哪些|是什么)?"),
+        "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE d.name CONTAINS $x RETURN d.name, s.name, s.description"
+    ),
+]
+
+
+_QUESTION_WORD_RE = re.compile(r"哪些|什么|哪种")
+
+
+def _match_cypher_template(user_query: str):
+    """匹配常见问法模板，命中返回(Cypher语句, 参数)，否则返回None"""
+    question = user_query.strip().rstrip("？?。！!")
+    for pattern, cypher in _CYPHER_TEMPLATES:
+        match = pattern.fullmatch(question)
+        # 捕获内容中仍含疑问词说明问法不符合模板，交给LLM处理
+        if match and match.group(1).strip() and not _QUESTION_WORD_RE.search(match.group(1)):
+            return cypher, {"x": match.group(1).strip()}
+    return None
+
+
 class TextToCypherConverter:
     def __init__(self):
         # Neo4j连接配置
@@ -22,59 +129,129 @@ class TextToCypherConverter:
         self.neo4j_username = "neo4j"
         self.neo4j_password = "password123"
         
-        # 初始化Neo4j驱动
+        # 初始化Neo4j驱动（交互模式下会话可能长时间空闲，保持连接池中的连接可用）
+        # 连接空闲超过30秒后，使用前先做存活检查，避免被代理或负载均衡断开的连接导致查询失败
         self.driver = GraphDatabase.driver(
             self.neo4j_uri, 
-            auth=(self.neo4j_username, self.neo4j_password)
+            auth=(self.neo4j_username, self.neo4j_password),
+            max_connection_pool_size=32,
+            max_connection_lifetime=3600,
+            connection_acquisition_timeout=60,
+            connection_timeout=5,
+            keep_alive=True,
+            liveness_check_timeout=30
         )
+        # 整个转换器生命周期内复用同一个会话
+        self.session = self.driver.session()
         
-        # 初始化OpenAI客户端（DeepSeek API）
+        # 初始化OpenAI客户端（DeepSeek API），异步客户端用于批量并发生成
         self.openai_client = OpenAI(
             base_url="https://api.deepseek.com",
             api_key=os.getenv("DEEPSEEK_API_KEY")
         )
+        self.async_openai_client = AsyncOpenAI(
+            base_url="https://api.deepseek.com",
+            api_key=os.getenv("DEEPSEEK_API_KEY")
+        )
         
-        # 获取数据库模式信息
-        self.schema_info = self.get_database_schema()
+        # 获取数据库模式信息（优先读取本地缓存）
+        self.schema_info = self.load_database_schema()
         self.schema_description = self.build_schema_description()
         
-    def __del__(self):
-        """析构函数，关闭数据库连接"""
-        if hasattr(self, 'driver'):
-            self.driver.close()
+        # 生成的Cypher查询缓存，键包含模式描述哈希，模式变化后旧缓存自动失效
+        self._schema_hash = hashlib.sha1(self.schema_description.encode("utf-8")).hexdigest()[:16]
+        self._cypher_cache = self.load_cypher_cache()
+        
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """关闭数据库会话和驱动"""
+        self.session.close()
+        self.driver.close()
+    
+    def schema_cache_path(self) -> str:
+        """数据库模式缓存文件路径，按连接地址区分"""
+        digest = hashlib.md5(self.neo4j_uri.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(os.path.expanduser("~/.cache"), f"tc_schema_{digest}.json")
+    
+    def load_database_schema(self) -> Dict[str, Any]:
+        """加载数据库模式信息，缓存未过期时直接读取，否则查询数据库并写入缓存"""
+        cache_path = self.schema_cache_path()
+        try:
+            if time.time() - os.path.getmtime(cache_path) < SCHEMA_CACHE_TTL:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        schema_info = self.get_database_schema()
+        
+        # 空数据库不缓存，避免测试数据导入后仍读到空模式
+        if schema_info["node_labels"]:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                with open(cache_path, "w", encoding="utf-8") as f:
+                    json.dump(schema_info, f, ensure_ascii=False)
+            except OSError as e:
+                print(f"写入数据库模式缓存失败: {e}")
+        return schema_info
+    
+    def load_cypher_cache(self) -> Dict[str, str]:
+        """加载持久化的Cypher查询缓存，文件不存在或损坏时返回空缓存"""
+        try:
+            with open(CYPHER_CACHE_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_cypher_cache(self):
+        """持久化Cypher查询缓存，超出容量时淘汰最早写入的条目"""
+        while len(self._cypher_cache) > CYPHER_CACHE_MAX_SIZE:
+            del self._cypher_cache[next(iter(self._cypher_cache))]
+        try:
+            os.makedirs(os.path.dirname(CYPHER_CACHE_PATH), exist_ok=True)
+            with open(CYPHER_CACHE_PATH, "w", encoding="utf-8") as f:
+                json.dump(self._cypher_cache, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"写入Cypher查询缓存失败: {e}")
     
     def get_database_schema(self) -> Dict[str, Any]:
         """获取数据库模式信息"""
-        with self.driver.session() as session:
-            # 查询节点标签
-            node_labels_query = "CALL db.labels() YIELD label RETURN label"
-            node_labels = [record["label"] for record in session.run(node_labels_query)]
-            
-            # 查询关系类型
-            relationship_types_query = "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
-            relationship_types = [record["relationshipType"] for record in session.run(relationship_types_query)]
-            
-            # 查询每个标签的属性
-            properties_by_label = {}
-            for label in node_labels:
-                try:
-                    properties_query = f"""
-                    MATCH (n:{label})
-                    WITH n LIMIT 1
-                    RETURN keys(n) as properties
-                    """
-                    result = session.run(properties_query)
-                    record = result.single()
-                    if record and record["properties"]:
-                        properties_by_label[label] = record["properties"]
-                except Exception as e:
-                    print(f"获取{label}属性时出错: {e}")
-            
-            return {
-                "node_labels": node_labels,
-                "relationship_types": relationship_types,
-                "properties_by_label": properties_by_label
-            }
+        session = self.session
+        # 查询节点标签
+        node_labels_query = "CALL db.labels() YIELD label RETURN label"
+        node_labels = [record["label"] for record in session.run(node_labels_query)]
+        
+        # 查询关系类型
+        relationship_types_query = "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
+        relationship_types = [record["relationshipType"] for record in session.run(relationship_types_query)]
+        
+        # 一次查询获取所有标签的属性
+        properties_by_label = {}
+        try:
+            properties_query = """
+            CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName
+            RETURN nodeLabels, propertyName
+            """
+            for record in session.run(properties_query):
+                if record["propertyName"] is None:
+                    continue
+                for label in record["nodeLabels"]:
+                    properties = properties_by_label.setdefault(label, [])
+                    if record["propertyName"] not in properties:
+                        properties.append(record["propertyName"])
+        except Exception as e:
+            print(f"获取节点属性时出错: {e}")
+        
+        return {
+            "node_labels": node_labels,
+            "relationship_types": relationship_types,
+            "properties_by_label": properties_by_label
+        }
     
     def build_schema_description(self) -> str:
         """构建数据库模式的文本描述"""
@@ -100,14 +277,17 @@ class TextToCypherConverter:
 - 使用toLower()函数进行不区分大小写的文本匹配
 - 使用CONTAINS或正则表达式进行模糊匹配
 - 关系方向要正确
+- 各类节点的name属性有唯一约束索引，已知完整名称时使用等值条件（如 d.name = '糖尿病'）可直接命中索引
         """
         
         return schema_desc
     
-    def generate_cypher_query(self, user_query: str) -> str:
-        """使用LLM生成Cypher查询语句"""
-        
-        # 构建提示词
+    def cypher_cache_key(self, user_query: str) -> str:
+        """Cypher查询缓存键：模式描述哈希 + 用户问题"""
+        return hashlib.sha256((self._schema_hash + user_query).encode("utf-8")).hexdigest()
+    
+    def build_cypher_request(self, user_query: str) -> Dict[str, Any]:
+        """构建生成Cypher查询的LLM请求参数（流式接收）"""
         prompt = f"""
 {self.schema_description}
 
@@ -128,80 +308,147 @@ class TextToCypherConverter:
 请只返回Cypher查询语句，不要包含任何解释或格式标记。
         """
         
+        return dict(
+            model="deepseek-chat",
+            messages=[
+                {
+                    "role": "system", 
+                    "content": "你是一个专业的Cypher查询专家。请根据用户的自然语言问题生成准确的Cypher查询语句。只返回查询语句，不要包含任何Markdown格式或其他说明。"
+                },
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ],
+            temperature=0,
+            max_tokens=500,
+            stream=True
+        )
+    
+    def clean_cypher(self, content: str) -> str:
+        """清理LLM输出得到Cypher语句（执行成功后才由cache_cypher写入缓存）"""
+        # 只保留第一条语句，清理生成的Cypher语句
+        if ";" in content:
+            content = content[:content.index(";") + 1]
+        return _add_index_hints(_CYPHER_FENCE_RE.sub('', content).strip())
+    
+    def cache_cypher(self, user_query: str, cypher: str):
+        """缓存执行成功的LLM生成Cypher语句"""
+        cache_key = self.cypher_cache_key(user_query)
+        if self._cypher_cache.get(cache_key) != cypher:
+            self._cypher_cache[cache_key] = cypher
+            self.save_cypher_cache()
+    
+    def evict_cypher(self, user_query: str):
+        """移除执行失败的缓存Cypher语句，下次重新生成"""
+        if self._cypher_cache.pop(self.cypher_cache_key(user_query), None) is not None:
+            self.save_cypher_cache()
+    
+    def generate_cypher_query(self, user_query: str) -> str:
+        """使用LLM生成Cypher查询语句，相同模式下的相同问题直接复用缓存"""
+        cache_key = self.cypher_cache_key(user_query)
+        if cache_key in self._cypher_cache:
+            return self._cypher_cache[cache_key]
+        
         try:
-            response = self.openai_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "你是一个专业的Cypher查询专家。请根据用户的自然语言问题生成准确的Cypher查询语句。只返回查询语句，不要包含任何Markdown格式或其他说明。"
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=500
-            )
-            
-            # 清理生成的Cypher语句
-            cypher = response.choices[0].message.content.strip()
-            cypher = re.sub(r'```cypher\n?', '', cypher)
-            cypher = re.sub(r'```\n?', '', cypher)
-            cypher = cypher.strip()
-            
-            return cypher
+            # 流式接收，语句完整后立即停止，不再等待后续无关输出
+            stream = self.openai_client.chat.completions.create(**self.build_cypher_request(user_query))
+            content = ""
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                    if _cypher_complete(content):
+                        break
+            stream.close()
+            return self.clean_cypher(content)
             
         except Exception as e:
             raise Exception(f"生成Cypher查询时出错: {e}")
     
-    def execute_cypher_query(self, cypher: str) -> List[Dict[str, Any]]:
-        """执行Cypher查询并返回结果"""
+    async def agenerate_cypher_query(self, user_query: str) -> str:
+        """generate_cypher_query的异步版本，用于并发生成多个问题的Cypher查询"""
+        cache_key = self.cypher_cache_key(user_query)
+        if cache_key in self._cypher_cache:
+            return self._cypher_cache[cache_key]
+        
         try:
-            with self.driver.session() as session:
-                result = session.run(cypher)
-                records = []
-                for record in result:
-                    records.append(dict(record))
-                return records
+            stream = await self.async_openai_client.chat.completions.create(**self.build_cypher_request(user_query))
+            content = ""
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                    if _cypher_complete(content):
+                        break
+            await stream.close()
+            return self.clean_cypher(content)
+            
         except Exception as e:
-            raise Exception(f"执行Cypher查询时出错: {e}")
+            raise Exception(f"生成Cypher查询时出错: {e}")
     
-    def validate_cypher_syntax(self, cypher: str) -> Tuple[bool, str]:
-        """验证Cypher语句语法"""
+    def execute_cypher_query(self, cypher: str, parameters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """执行Cypher查询并返回结果"""
         try:
-            with self.driver.session() as session:
-                # 使用EXPLAIN来验证语法而不执行查询
-                explain_cypher = f"EXPLAIN {cypher}"
-                session.run(explain_cypher)
-                return True, "语法正确"
+            # 语法错误会在返回结果前由session.run直接抛出，无需单独的EXPLAIN校验
+            return self.session.run(cypher, parameters).data()
+        except CypherSyntaxError:
+            raise
         except Exception as e:
-            return False, str(e)
+            raise Exception(f"执行Cypher查询时出错: {e}")
     
     def format_results(self, results: List[Dict[str, Any]], user_query: str) -> str:
         """格式化查询结果"""
         if not results:
             return "未找到匹配的结果。"
         
-        formatted_output = f"查询问题：{user_query}\n"
-        formatted_output += f"找到 {len(results)} 条结果：\n\n"
+        header = f"查询问题：{user_query}\n找到 {len(results)} 条结果：\n\n"
         
-        for i, record in enumerate(results, 1):
-            formatted_output += f"{i}. "
-            
-            # 格式化每条记录
-            formatted_record = []
-            for key, value in record.items():
-                if value is not None:
-                    formatted_record.append(f"{key}: {value}")
-            
-            formatted_output += " | ".join(formatted_record) + "\n"
-        
-        return formatted_output
+        # 每条记录一行，跳过空值
+        lines = (
+            f"{i}. " + " | ".join(f"{key}: {value}" for key, value in record.items() if value is not None) + "\n"
+            for i, record in enumerate(results, 1)
+        )
+        return header + "".join(lines)
+    
+    def plan_cypher(self, user_query: str) -> Tuple[str, Dict[str, Any]]:
+        """确定要执行的Cypher查询：优先匹配常见问法模板，未命中再由LLM生成"""
+        template = _match_cypher_template(user_query)
+        if template:
+            return template
+        return self.generate_cypher_query(user_query), None
+    
+    async def aplan_cypher(self, user_query: str) -> Tuple[str, Dict[str, Any]]:
+        """plan_cypher的异步版本"""
+        template = _match_cypher_template(user_query)
+        if template:
+            return template
+        return await self.agenerate_cypher_query(user_query), None
     
     def query(self, user_query: str, show_cypher: bool = True) -> Dict[str, Any]:
         """主要查询方法"""
+        start_time = time.time()
+        try:
+            plan = self.plan_cypher(user_query)
+        except Exception as e:
+            plan = e
+        return self.run_planned_query(user_query, plan, start_time, show_cypher)
+    
+    async def aquery_batch(self, user_queries: List[str], show_cypher: bool = True) -> List[Dict[str, Any]]:
+        """
+        批量查询：并发生成所有问题的Cypher查询（LLM调用相互重叠），再依次在共享会话上执行
+        每条结果的耗时从批量开始计算
+        """
+        start_time = time.time()
+        plans = await asyncio.gather(
+            *(self.aplan_cypher(user_query) for user_query in user_queries),
+            return_exceptions=True
+        )
+        return [
+            self.run_planned_query(user_query, plan, start_time, show_cypher)
+            for user_query, plan in zip(user_queries, plans)
+        ]
+    
+    def run_planned_query(self, user_query: str, plan, start_time: float, show_cypher: bool = True) -> Dict[str, Any]:
+        """执行已确定的Cypher查询（plan为(Cypher语句, 参数)，生成失败时为异常）并整理结果"""
         result = {
             "user_query": user_query,
             "cypher": None,
@@ -212,24 +459,30 @@ class TextToCypherConverter:
         }
         
         try:
-            import time
-            start_time = time.time()
-            
-            # 生成Cypher查询
-            cypher = self.generate_cypher_query(user_query)
+            if isinstance(plan, Exception):
+                raise plan
+            cypher, parameters = plan
             result["cypher"] = cypher
             
             if show_cypher:
                 print(f"生成的Cypher查询：\n{cypher}\n")
+                if parameters:
+                    print(f"查询参数：{parameters}\n")
             
-            # 验证语法
-            is_valid, validation_message = self.validate_cypher_syntax(cypher)
-            if not is_valid:
-                result["error"] = f"Cypher语法错误：{validation_message}"
+            # 执行查询（语法错误由执行时的异常捕获）；LLM生成的语句（无参数）执行成功才缓存，失败则移除缓存
+            try:
+                query_results = self.execute_cypher_query(cypher, parameters)
+            except CypherSyntaxError as e:
+                if parameters is None:
+                    self.evict_cypher(user_query)
+                result["error"] = f"Cypher语法错误：{e}"
                 return result
-            
-            # 执行查询
-            query_results = self.execute_cypher_query(cypher)
+            except Exception:
+                if parameters is None:
+                    self.evict_cypher(user_query)
+                raise
+            if parameters is None:
+                self.cache_cypher(user_query, cypher)
             result["results"] = query_results
             
             # 格式化输出
@@ -253,18 +506,17 @@ def interactive_query_session():
     print("输入 'help' 查看示例查询")
     print("=" * 60)
     
-    converter = TextToCypherConverter()
-    
-    while True:
-        try:
-            user_input = input("\n请输入您的问题: ").strip()
+    with TextToCypherConverter() as converter:
+        while True:
+            try:
+                user_input = input("\n请输入您的问题: ").strip()
             
-            if user_input.lower() in ['quit', 'exit', '退出']:
-                print("感谢使用！再见！")
-                break
+                if user_input.lower() in ['quit', 'exit', '退出']:
+                    print("感谢使用！再见！")
+                    break
             
-            if user_input.lower() in ['help', '帮助']:
-                print("""
+                if user_input.lower() in ['help', '帮助']:
+                    print("""
 示例查询：
 1. 查找糖尿病的所有症状
 2. 什么药物可以治疗高血压  
@@ -275,28 +527,28 @@ def interactive_query_session():
 7. 哪些疾病会导致头痛
 8. 查找所有抗生素类药物
                 """)
-                continue
+                    continue
             
-            if not user_input:
-                print("请输入有效的问题！")
-                continue
+                if not user_input:
+                    print("请输入有效的问题！")
+                    continue
             
-            # 执行查询
-            result = converter.query(user_input, show_cypher=True)
+                # 执行查询
+                result = converter.query(user_input, show_cypher=True)
             
-            if result["error"]:
-                print(f"❌ 查询出错：{result['error']}")
-            else:
-                print(f"✅ 执行成功（耗时：{result['execution_time']:.2f}秒）")
-                print("\n" + "─" * 50)
-                print(result["formatted_output"])
-                print("─" * 50)
+                if result["error"]:
+                    print(f"❌ 查询出错：{result['error']}")
+                else:
+                    print(f"✅ 执行成功（耗时：{result['execution_time']:.2f}秒）")
+                    print("\n" + "─" * 50)
+                    print(result["formatted_output"])
+                    print("─" * 50)
                 
-        except KeyboardInterrupt:
-            print("\n\n程序被用户中断。再见！")
-            break
-        except Exception as e:
-            print(f"❌ 系统错误：{e}")
+            except KeyboardInterrupt:
+                print("\n\n程序被用户中断。再见！")
+                break
+            except Exception as e:
+                print(f"❌ 系统错误：{e}")
 
 def run_batch_test():
     """运行批量测试"""
@@ -312,11 +564,14 @@ def run_batch_test():
         "阿莫西林可以治疗什么疾病"
     ]
     
-    converter = TextToCypherConverter()
+    # 所有测试问题的Cypher并发生成
+    with TextToCypherConverter() as converter:
+        results = asyncio.run(converter.aquery_batch(test_queries, show_cypher=False))
     
-    for i, query in enumerate(test_queries, 1):
+    for i, result in enumerate(results, 1):
         print(f"\n{'='*20} 测试 {i} {'='*20}")
-        result = converter.query(query, show_cypher=True)
+        if result["cypher"]:
+            print(f"生成的Cypher查询：\n{result['cypher']}\n")
         
         if result["error"]:
             print(f"❌ {result['error']}")
@@ -9,14 +9,39 @@ from langchain_core.documents import Document
 from langchain.chains.query_constructor.base import AttributeInfo
 from langchain.retrievers.self_query.base import SelfQueryRetriever
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from pydantic import BaseModel, Field
+import hashlib
+import json
 import os
+import shutil
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+# 保证可以跨目录导入utils工具函数
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from utils.embeddings import get_embedder
+
 # 加载环境变量
 load_dotenv()
 
+EMBED_MODEL_NAME = "BAAI/bge-small-zh"
+PERSIST_ROOT = "data/chroma"
+
+# 检索结果中单条新闻的输出模板
+NEWS_TEMPLATE = (
+    "📰 新闻 {index}:\n"
+    "   标题：{title}\n"
+    "   分类：{category}\n"
+    "   作者：{author}\n"
+    "   地区：{region}\n"
+    "   发布日期：{publish_date}\n"
+    "   点赞：{likes_count} | 评论：{comments_count} | 分享：{shares_count}\n"
+    "   标签：{tags}\n"
+    "   内容预览：{preview}...\n"
+    "   {separator}\n"
+)
+
 # 定义新闻元数据模型
 class NewsMetadata(BaseModel):
     """小红书新闻元数据模型，定义了需要提取的新闻属性"""
@@ -144,14 +169,31 @@ def create_mock_news_data():
         },
     ]
 
-    # 将数据转换为Document对象
-    documents = []
-    for news in mock_news:
-        metadata = {key: value for key, value in news.items() if key != "content"}
-        doc = Document(page_content=news["content"], metadata=metadata)
-        documents.append(doc)
+    # 将数据转换为Document对象（取出content后剩余字段直接作为元数据）
+    return [Document(page_content=news.pop("content"), metadata=news) for news in mock_news]
+
+
+def load_news_vectorstore(news_docs, embed_model):
+    """
+    加载持久化的新闻向量存储，不存在时构建并持久化
+    目录名包含文档内容、元数据和模型名称的哈希，新闻数据变化后自动重建
+    """
+    docs_key = json.dumps(
+        [doc.page_content + str(doc.metadata) for doc in news_docs] + [EMBED_MODEL_NAME],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    docs_hash = hashlib.sha1(docs_key.encode("utf-8")).hexdigest()[:12]
+    persist_dir = os.path.join(PERSIST_ROOT, f"xhs_news_{docs_hash}")
 
-    return documents
+    # 构建完成后才写入标记文件，上次构建被中断时删除残缺目录重新构建
+    marker_path = os.path.join(persist_dir, ".build_complete")
+    if os.path.exists(marker_path):
+        return Chroma(persist_directory=persist_dir, embedding_function=embed_model)
+    shutil.rmtree(persist_dir, ignore_errors=True)
+    vectorstore = Chroma.from_documents(news_docs, embed_model, persist_directory=persist_dir)
+    Path(marker_path).touch()
+    return vectorstore
 
 
 # 主程序
@@ -171,8 +213,8 @@ def main():
 
     # 创建向量存储
     print("🔄 正在创建向量存储...")
-    embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-zh")
-    vectorstore = Chroma.from_documents(news_docs, embed_model)
+    embed_model = get_embedder(EMBED_MODEL_NAME)
+    vectorstore = load_news_vectorstore(news_docs, embed_model)
     print("✅ 向量存储创建完成\n")
 
     # 配置检索器的元数据字段
@@ -273,19 +315,11 @@ def main():
 
             print(f"✅ 找到 {len(results)} 条匹配的新闻：\n")
 
-            for i, doc in enumerate(results, 1):
-                print(f"📰 新闻 {i}:")
-                print(f"   标题：{doc.metadata['title']}")
-                print(f"   分类：{doc.metadata['category']}")
-                print(f"   作者：{doc.metadata['author']}")
-                print(f"   地区：{doc.metadata['region']}")
-                print(f"   发布日期：{doc.metadata['publish_date']}")
-                print(
-                    f"   点赞：{doc.metadata['likes_count']} | 评论：{doc.metadata['comments_count']} | 分享：{doc.metadata['shares_count']}"
-                )
-                print(f"   标签：{doc.metadata['tags']}")
-                print(f"   内容预览：{doc.page_content[:50]}...")
-                print(f"   {'-'*40}")
+            # 所有结果拼接后一次性输出
+            sys.stdout.write("".join(
+                NEWS_TEMPLATE.format(index=i, preview=doc.page_content[:50], separator="-" * 40, **doc.metadata)
+                for i, doc in enumerate(results, 1)
+            ))
 
         except Exception as e:
             print(f"❌ 查询出错：{str(e)}")
@@ -0,0 +1,147 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+
+import torch
+from huggingface_hub import try_to_load_from_cache
+from langchain_huggingface import HuggingFaceEmbeddings
+
+DEFAULT_EMBED_MODEL = "BAAI/bge-small-zh"
+
+# 导出的ONNX模型（FP32及INT8量化）本地保存目录，及量化配置（可用EMBED_QUANT_CONFIG改为avx2、avx512、arm64）
+ONNX_MODEL_ROOT = "data/models"
+QUANT_CONFIG = os.getenv("EMBED_QUANT_CONFIG", "avx512_vnni")
+
+
+def configure_torch_threads():
+    """按CPU核数设置PyTorch计算线程（可用TORCH_NUM_THREADS覆盖），算子间并行固定为1"""
+    torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", os.cpu_count() or 4)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 已有并行任务启动后不能再修改，保持现状
+        pass
+
+
+def _is_cached_locally(model_name):
+    """模型是否已下载到本地HuggingFace缓存（本地路径直接视为已缓存）"""
+    if os.path.isdir(model_name):
+        return True
+    return isinstance(try_to_load_from_cache(model_name, "config.json"), str)
+
+
+def _wrap_inference_mode(embedder):
+    """让底层SentenceTransformer.encode始终在torch.inference_mode下运行，省去autograd开销"""
+    client = getattr(embedder, "_client", None) or getattr(embedder, "client", None)
+    if client is None:
+        return embedder
+    encode = client.encode
+
+    @wraps(encode)
+    def encode_inference_mode(*args, **kwargs):
+        with torch.inference_mode():
+            return encode(*args, **kwargs)
+
+    client.encode = encode_inference_mode
+    return embedder
+
+
+def _export_onnx(model_name, local_kwargs):
+    """
+    返回保存了ONNX模型的本地目录，首次运行时导出（需安装optimum[onnxruntime]），之后直接加载，不再重复导出
+    先导出到临时目录，完成后再改名，中断的导出不会留下残缺模型
+    """
+    local_dir = os.path.join(ONNX_MODEL_ROOT, model_name.replace("/", "__") + "-onnx")
+    if os.path.exists(os.path.join(local_dir, "onnx", "model.onnx")):
+        return local_dir
+
+    from sentence_transformers import SentenceTransformer
+
+    print(f"🔧 正在导出ONNX模型: {local_dir}")
+    tmp_dir = f"{local_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    SentenceTransformer(model_name, device="cpu", backend="onnx", **local_kwargs).save(tmp_dir)
+    shutil.rmtree(local_dir, ignore_errors=True)
+    os.replace(tmp_dir, local_dir)
+    return local_dir
+
+
+def _load_onnx(model_name, encode_kwargs, local_kwargs):
+    """加载本地导出的FP32 ONNX模型，池化和归一化沿用模型自带配置"""
+    return HuggingFaceEmbeddings(
+        model_name=_export_onnx(model_name, local_kwargs),
+        model_kwargs={"device": "cpu", "backend": "onnx"},
+        encode_kwargs=encode_kwargs,
+    )
+
+
+def _load_quantized_onnx(model_name, encode_kwargs, local_kwargs):
+    """
+    加载INT8动态量化的ONNX模型，首次运行时在导出的ONNX模型目录中量化（需安装optimum[onnxruntime]）
+    池化和归一化沿用模型自带配置
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    local_dir = _export_onnx(model_name, local_kwargs)
+    file_name = f"onnx/model_qint8_{QUANT_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        print(f"🔧 正在量化ONNX模型: {local_dir}")
+        model = SentenceTransformer(local_dir, device="cpu", backend="onnx")
+        export_dynamic_quantized_onnx_model(model, QUANT_CONFIG, local_dir)
+
+    return HuggingFaceEmbeddings(
+        model_name=local_dir,
+        model_kwargs={"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": file_name}},
+        encode_kwargs=encode_kwargs,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_embedder(model_name=DEFAULT_EMBED_MODEL, quantize=False):
+    """
+    获取全局共享的向量化模型，同一进程内同名模型只加载一次
+    GPU上使用PyTorch半精度（FP16）；CPU上使用ONNX Runtime后端（首次运行导出ONNX模型并保存到ONNX_MODEL_ROOT，之后直接加载），失败时回退到PyTorch
+    输出向量已归一化，内积即余弦相似度
+    模型已在本地缓存时只读本地文件，跳过HuggingFace Hub的联网检查
+    quantize=True时CPU上优先使用INT8量化的ONNX模型，失败时回退到FP32
+    """
+    encode_kwargs = {"batch_size": 64, "normalize_embeddings": True}
+    local_kwargs = {"local_files_only": True} if _is_cached_locally(model_name) else {}
+    if torch.cuda.is_available():
+        return _wrap_inference_mode(HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}, **local_kwargs},
+            encode_kwargs=encode_kwargs,
+        ))
+
+    if quantize:
+        try:
+            return _load_quantized_onnx(model_name, encode_kwargs, local_kwargs)
+        except Exception as e:
+            print(f"⚠️ INT8量化模型加载失败，使用FP32模型: {e}")
+
+    try:
+        return _load_onnx(model_name, encode_kwargs, local_kwargs)
+    except Exception as e:
+        print(f"⚠️ ONNX后端加载失败，回退到PyTorch: {e}")
+        configure_torch_threads()
+        return _wrap_inference_mode(HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": "cpu", **local_kwargs},
+            encode_kwargs=encode_kwargs,
+        ))
+
+
+def preload_embedder(model_name=DEFAULT_EMBED_MODEL, quantize=False):
+    """在后台线程加载并预热向量化模型，返回Future，便于与网页抓取等I/O操作重叠执行"""
+    def load():
+        embedder = get_embedder(model_name, quantize)
+        embedder.embed_query("预热")
+        return embedder
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(load)
+    executor.shutdown(wait=False)
+    return future
@@ -1,15 +1,25 @@
+import os
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlparse
+
+# 本进程内已确认存在的输出目录，重复调用时跳过mkdir系统调用
+_ensured_dirs = set()
 
 def ensure_output_dir(output_dir):
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    key = os.fspath(output_dir)
+    if key in _ensured_dirs:
+        return
+    Path(key).mkdir(parents=True, exist_ok=True)
+    _ensured_dirs.add(key)
 
 
+@lru_cache(maxsize=4096)
 def get_output_filename(source_path_or_url):
-    # 处理本地路径和URL，生成合适的md文件名
-    if source_path_or_url.startswith("http://") or source_path_or_url.startswith("https://"):
-        name = source_path_or_url.rstrip("/").split("/")[-1]
-        if "." in name:
-            name = name[: name.rfind(".")]
+    # 处理本地路径和URL，生成合适的md文件名（同一来源重复出现时直接复用结果）
+    if source_path_or_url.startswith(("http://", "https://")):
+        name = urlparse(source_path_or_url).path.rstrip("/").rsplit("/", 1)[-1]
+        name = os.path.splitext(name)[0] or "index"
     else:
         name = Path(source_path_or_url).stem
     return f"{name}.md" 
\ No newline at end of file
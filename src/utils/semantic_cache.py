@@ -0,0 +1,27 @@
+import numpy as np
+
+
+class SemanticCache:
+    """
+    语义响应缓存：以问题向量为键，相似度达到阈值即复用已缓存的回答
+    向量需已归一化，内积即余弦相似度
+    """
+
+    def __init__(self, threshold=0.95):
+        self.threshold = threshold
+        self._embeddings = None
+        self._answers = []
+
+    def lookup(self, query_embedding):
+        """返回最相似且达到阈值的缓存回答，未命中返回None"""
+        if self._embeddings is None:
+            return None
+        sims = self._embeddings @ query_embedding
+        best = int(np.argmax(sims))
+        return self._answers[best] if sims[best] >= self.threshold else None
+
+    def add(self, query_embedding, answer):
+        """写入一条缓存"""
+        row = np.asarray(query_embedding, dtype=np.float32)[None, :]
+        self._embeddings = row if self._embeddings is None else np.vstack([self._embeddings, row])
+        self._answers.append(answer)
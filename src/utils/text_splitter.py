@@ -0,0 +1,67 @@
+from langchain_core.documents import Document
+
+try:
+    # Rust实现的递归文本分割器（pip install semantic-text-splitter），大文档上比纯Python实现快一个数量级以上
+    from semantic_text_splitter import TextSplitter
+except ImportError:
+    TextSplitter = None
+
+# 当前使用的分割器名称，可作为索引缓存键的一部分（不同分割器的分块边界不同）
+SPLITTER_NAME = "semantic-text-splitter" if TextSplitter is not None else "recursive-character"
+
+
+def split_documents(docs, chunk_size=1000, chunk_overlap=200, tokenizer_name=None):
+    """
+    将文档分块，未安装semantic-text-splitter时回退到RecursiveCharacterTextSplitter
+    默认按字符数计算块大小；指定tokenizer_name（HuggingFace分词器）时按token数计算，
+    semantic-text-splitter在Rust中完成分词计数，不会对每个候选片段回调Python长度函数
+    """
+    if TextSplitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        if tokenizer_name:
+            from transformers import AutoTokenizer
+
+            text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                AutoTokenizer.from_pretrained(tokenizer_name), chunk_size=chunk_size, chunk_overlap=chunk_overlap
+            )
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return text_splitter.split_documents(docs)
+
+    if tokenizer_name:
+        from tokenizers import Tokenizer
+
+        splitter = TextSplitter.from_huggingface_tokenizer(
+            Tokenizer.from_pretrained(tokenizer_name), chunk_size, overlap=chunk_overlap
+        )
+    else:
+        splitter = TextSplitter(chunk_size, overlap=chunk_overlap)
+    return [
+        Document(page_content=chunk, metadata=dict(doc.metadata))
+        for doc in docs
+        for chunk in splitter.chunks(doc.page_content)
+    ]
+
+
+def _trim_overlap(prev, cur, max_overlap, min_overlap):
+    """去掉cur开头与prev结尾重叠的部分"""
+    for n in range(min(len(prev), len(cur), max_overlap), min_overlap - 1, -1):
+        if prev.endswith(cur[:n]):
+            return cur[n:]
+    return cur
+
+
+def join_chunks(docs, separator="\n\n", max_overlap=300, min_overlap=20):
+    """
+    拼接检索到的文档块作为大模型上下文
+    相邻两块在原文中连续时，分块重叠（chunk_overlap）产生的重复文本只保留一份，缩短提示词
+    """
+    parts = []
+    for doc in docs:
+        text = doc.page_content
+        if parts:
+            text = _trim_overlap(parts[-1], text, max_overlap, min_overlap)
+        if text:
+            parts.append(text)
+    return separator.join(parts)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+
+
+class MatrixInMemoryVectorStore(InMemoryVectorStore):
+    """
+    内存向量存储：所有文档向量缓存为一个float32矩阵，检索时一次矩阵乘法完成打分
+    要求嵌入向量已归一化（内积即余弦相似度），文档增删后矩阵自动重建
+    """
+
+    def __init__(self, embedding):
+        super().__init__(embedding)
+        self._docs = None
+        self._matrix = None
+
+    def _invalidate(self):
+        self._docs = None
+        self._matrix = None
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        self._invalidate()
+        return super().add_documents(documents, ids=ids, **kwargs)
+
+    async def aadd_documents(self, documents, ids=None, **kwargs):
+        self._invalidate()
+        return await super().aadd_documents(documents, ids=ids, **kwargs)
+
+    def delete(self, ids=None, **kwargs):
+        self._invalidate()
+        return super().delete(ids=ids, **kwargs)
+
+    def _similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        # 带过滤条件时沿用父类逐条过滤的实现
+        if filter is not None:
+            return super()._similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+        if self._matrix is None:
+            self._docs = list(self.store.values())
+            if not self._docs:
+                return []
+            self._matrix = np.asarray([doc["vector"] for doc in self._docs], dtype=np.float32)
+
+        scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top_k = np.argpartition(-scores, k - 1)[:k]
+        top_k = top_k[np.argsort(-scores[top_k])]
+        return [
+            (
+                Document(id=doc["id"], page_content=doc["text"], metadata=doc["metadata"]),
+                float(scores[idx]),
+                doc["vector"],
+            )
+            for idx in top_k
+            for doc in [self._docs[idx]]
+        ]
+
+
+# 文档数达到该值时改用HNSW近似索引，更小的语料直接精确检索
+HNSW_MIN_DOCS = 10000
+
+
+def build_hnsw_vectorstore(documents, embedding, m=32, ef_construction=200, ef_search=64):
+    """
+    基于Faiss HNSW图索引构建向量存储，检索复杂度约为O(log N)
+    嵌入向量已归一化，使用内积度量即等价于余弦相似度
+    """
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+    texts = [doc.page_content for doc in documents]
+    vectors = embedding.embed_documents(texts)
+
+    index = faiss.IndexHNSWFlat(len(vectors[0]), m, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = ef_construction
+    vector_store = FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+    )
+    vector_store.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in documents])
+    index.hnsw.efSearch = ef_search
+    return vector_store
+
+
+def build_vectorstore(documents, embedding):
+    """按语料规模选择向量存储：小语料用矩阵精确检索，大语料用HNSW近似索引（需安装faiss-cpu）"""
+    if len(documents) >= HNSW_MIN_DOCS:
+        return build_hnsw_vectorstore(documents, embedding)
+    vector_store = MatrixInMemoryVectorStore(embedding)
+    vector_store.add_documents(documents)
+    return vector_store
+
+
+# 向量索引缓存目录
+INDEX_CACHE_ROOT = "data/rag_cache"
+
+
+def index_cache_path(*key_parts):
+    """根据数据来源、分块参数和模型名称生成向量索引缓存文件路径，任一变化都会使用新的缓存"""
+    digest = hashlib.sha1("|".join(map(str, key_parts)).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(INDEX_CACHE_ROOT, f"{digest}.json")
+
+
+def load_cached_vectorstore(path, embedding):
+    """加载缓存的内存向量存储，缓存不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    return MatrixInMemoryVectorStore.load(path, embedding)
+
+
+def save_vectorstore(vector_store, path):
+    """缓存内存向量存储（含文档、元数据和向量）；HNSW索引不缓存"""
+    if isinstance(vector_store, InMemoryVectorStore):
+        vector_store.dump(path)
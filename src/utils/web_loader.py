@@ -0,0 +1,17 @@
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_community.document_loaders.web_base import default_header_template
+
+
+def create_session(pool_connections=8, pool_maxsize=16):
+    """创建复用连接的HTTP会话：同一主机的多个页面共用keep-alive连接，并启用gzip压缩传输"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # 沿用WebBaseLoader的默认请求头，User-Agent为空时保留requests的默认值
+    headers = {key: value for key, value in default_header_template.items() if value}
+    headers["Accept-Encoding"] = "gzip, deflate"
+    session.headers.update(headers)
+    return session